@@ -6,8 +6,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import glob
 import io
+import zstandard as zstd
 from fpdf import FPDF
-import base64
 import tempfile
 from forex_python.converter import CurrencyRates
 from currency_converter import CurrencyConverter, ECB_URL
@@ -43,19 +43,6 @@ st.markdown("""
         width: 100% !important;
         overflow-x: visible !important;
     }
-    /* Style the download button */
-    .download-button {
-        background-color: #4CAF50;
-        color: white;
-        padding: 10px 15px;
-        text-align: center;
-        text-decoration: none;
-        display: inline-block;
-        font-size: 16px;
-        margin: 4px 2px;
-        cursor: pointer;
-        border-radius: 4px;
-    }
 </style>
 """, unsafe_allow_html=True)
 
@@ -515,6 +502,14 @@ def process_aws_project_resources(aws_data):
         return {}
 
 # ----- Azure Cost Functions -----
+def load_raw(path, opener=open):
+    """Load a raw cost JSON file, transparently decompressing .json.zst"""
+    with opener(path, "rb") as f:
+        data = f.read()
+    if path.endswith(".zst"):
+        data = zstd.ZstdDecompressor().decompress(data)
+    return json.loads(data)
+
 def get_azure_costs_from_files():
     """Read Azure cost data from MinIO bucket"""
     try:
@@ -534,8 +529,10 @@ def get_azure_costs_from_files():
         
         results = {}
         
-        # Find all JSON files in the Azure directory
-        azure_files = fs.glob(f"{azure_dir}/*.json")
+        # Find all JSON files in the Azure directory (compressed ones last,
+        # so they win over a stale uncompressed copy of the same query)
+        azure_files = (sorted(fs.glob(f"{azure_dir}/*.json")) +
+                       sorted(fs.glob(f"{azure_dir}/*.json.zst")))
         
         # Process each file based on its name
         for file_path in azure_files:
@@ -563,11 +560,10 @@ def get_azure_costs_from_files():
                 dimension = "billing_cycle"
             else:
                 # If can't determine, use the filename without extension
-                dimension = os.path.splitext(file_name)[0]
+                dimension = file_name.split(".")[0]
             
             # Load the JSON data
-            with fs.open(file_path, 'r') as f:
-                results[dimension] = json.load(f)
+            results[dimension] = load_raw(file_path, fs.open)
         
         return results
     except Exception as e:
@@ -817,11 +813,14 @@ def process_azure_project_resources(azure_data):
         st.warning(f"Error processing Azure resource data: {str(e)}")
         return {}
 
-# ----- PDF Export Function -----
-def create_download_link(val, filename):
-    b64 = base64.b64encode(val)
-    return f'<a href="data:application/octet-stream;base64,{b64.decode()}" download="{filename}" class="download-button">Download PDF Report</a>'
+# ----- Chart Helpers -----
+def provider_pie_labels(aws_cost, azure_cost):
+    """Precomputed name + percentage labels for the AWS vs Azure pie (skips the autopct pass)"""
+    total = aws_cost + azure_cost
+    aws_pct = aws_cost / total * 100 if total else 0.0
+    return [f"AWS\n{aws_pct:.1f}%", f"Azure\n{100 - aws_pct:.1f}%"]
 
+# ----- PDF Export Function -----
 def export_as_pdf(aws_daily_df, aws_service_df, aws_project_df, azure_rg_df, azure_service_df, azure_project_df, 
                  aws_total, azure_total_inr, azure_total_usd, combined_total, inr_to_usd_rate,
                  aws_billing_cycle, azure_billing_cycle, 
@@ -863,9 +862,9 @@ def export_as_pdf(aws_daily_df, aws_service_df, aws_project_df, azure_rg_df, azu
     if aws_total > 0 or azure_total_usd > 0:
         plt.figure(figsize=(8, 6))
         plt.pie([aws_total, azure_total_usd], 
-               labels=["AWS", "Azure"], 
-               autopct='%1.1f%%',
-               colors=['#FF9900', '#0089D6'])
+               labels=provider_pie_labels(aws_total, azure_total_usd), 
+               colors=['#FF9900', '#0089D6'],
+               wedgeprops={"linewidth": 0})
         plt.title("Cost Distribution by Cloud Provider (USD)")
         
         # Create a temporary file for the image
@@ -1481,9 +1480,9 @@ with col2:  # Use the middle column
     
     # Use standard font sizes for the plot to keep it sharp
     ax.pie([aws_total, azure_total_usd], 
-           labels=["AWS", "Azure"], 
-           autopct='%1.1f%%',
-           colors=['#FF9900', '#0089D6'])
+           labels=provider_pie_labels(aws_total, azure_total_usd), 
+           colors=['#FF9900', '#0089D6'],
+           wedgeprops={"linewidth": 0})
     
     ax.set_title("Cost Distribution by Cloud Provider (USD)")
     
@@ -1502,8 +1501,12 @@ with pdf_container:
                             aws_untagged_regions_df, azure_untagged_regions_df,
                             aws_project_resources_dict, azure_project_resources_dict)
         
-        html = create_download_link(pdf_data, "cloud_cost_report.pdf")
-        st.markdown(html, unsafe_allow_html=True)
+        st.download_button(
+            label="Download PDF Report",
+            data=pdf_data,
+            file_name="cloud_cost_report.pdf",
+            mime="application/pdf"
+        )
         st.success("PDF report generated! Click the button above to download.")
 
 # Reset font size for subsequent plots
@@ -1,11 +1,18 @@
 import os
-import json
 import time
+import random
 import datetime
+import email.utils
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import argparse
+import tempfile
+import orjson
 import requests
-import pandas as pd
+import zstandard as zstd
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
+from urllib3.util.retry import Retry
 from azure.identity import AzureCliCredential, ClientSecretCredential
 import logging
 import s3fs  # Added for MinIO support
@@ -21,10 +28,76 @@ OUTPUT_DIR = f"{MINIO_BUCKET}/azure-cost-reports"
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# all grouping queries go out in one ARM batch request
+BATCH_URL        = "https://management.azure.com/batch?api-version=2020-06-01"
+QUERY_PATH       = (f"/subscriptions/{SUBSCRIPTION_ID}"
+                    f"/providers/Microsoft.CostManagement/query"
+                    f"?api-version={API_VERSION}")
+_QUERY_URL       = f"https://management.azure.com{QUERY_PATH}"
+
+# constant part of every CostManagement/query body
+_BODY_TEMPLATE = {
+    "type": "Usage",
+    "timeframe": "Custom",
+    "dataset": {
+        "granularity": "None",
+        "aggregation": {
+            "totalCost": { "name": "PreTaxCost", "function": "Sum" }
+        }
+    }
+}
+
+# project tag groupings, saved as raw_{key}.json
+PROJECT_GROUPINGS = {
+    "project_by_region": [
+        {"type": "TagKey", "name": "project"},
+        {"type": "Dimension", "name": "ResourceLocation"}
+    ],
+    "project_by_resource": [
+        {"type": "TagKey", "name": "project"},
+        {"type": "Dimension", "name": "ResourceId"}
+    ],
+}
+
+# CostManagement accepts two groupings per query, so the standard dimensions
+# are fetched in pairs and split client-side (these are never saved as-is)
+PAIRED_GROUPINGS = {
+    "ResourceGroupName+MeterCategory": [
+        {"type": "Dimension", "name": "ResourceGroupName"},
+        {"type": "Dimension", "name": "MeterCategory"}
+    ],
+    "MeterSubCategory+ResourceType": [
+        {"type": "Dimension", "name": "MeterSubCategory"},
+        {"type": "Dimension", "name": "ResourceType"}
+    ],
+}
+
+# single-dimension raw_{key}.json files: key -> (source query, columns kept)
+DERIVED_GROUPINGS = {
+    "ResourceGroupName": ("ResourceGroupName+MeterCategory", ["ResourceGroupName"]),
+    "MeterCategory":     ("ResourceGroupName+MeterCategory", ["MeterCategory"]),
+    "MeterSubCategory":  ("MeterSubCategory+ResourceType",   ["MeterSubCategory"]),
+    "ResourceType":      ("MeterSubCategory+ResourceType",   ["ResourceType"]),
+    "project":           ("project_by_region",               ["TagKey", "TagValue"]),
+    "ResourceLocation":  ("project_by_region",               ["ResourceLocation"]),
+}
+
+# raw_{key} responses are stored as compact zstd-compressed JSON
+RAW_COMPRESSOR   = zstd.ZstdCompressor(level=3)
+
+# bearer token + billing period are reused across runs
+# kept on local disk, never in the shared MinIO bucket
+CACHE_FILE       = os.environ.get("AZURE_TOKEN_CACHE",
+                                  os.path.join(tempfile.gettempdir(), "azure_cost_token_cache.json"))
+TOKEN_SLACK      = 300   # refresh the token this many seconds before expiry
+
 # throttling rules
-SHORT_SLEEP      = 10    # seconds between calls
-LONG_SLEEP       = 60    # seconds after every 3 calls
-CALLS_BEFORE_LONG = 3    # how many calls to do before the long sleep
+MAX_ATTEMPTS     = 5     # tries per query before giving up on 429s
+BACKOFF_BASE     = 2     # seconds, doubled on every throttled attempt
+BACKOFF_CAP      = 60    # upper bound for a single backoff sleep
+QUOTA_LOW_WATER  = 3     # pace calls once fewer requests than this remain
+BATCH_POLL_SLEEP = 5     # seconds between polls of an accepted (202) batch
+MAX_IN_FLIGHT    = 3     # concurrent CostManagement calls per subscription
 
 def init_minio():
     """Initialize MinIO connection"""
@@ -43,294 +116,344 @@ def get_last_week_range():
     start_date = today - datetime.timedelta(days=7)
     return start_date, end_date
 
+def _load_cache():
+    try:
+        with open(CACHE_FILE, "rb") as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
+def _update_cache(**entries):
+    """
+    Merge entries into CACHE_FILE (owner read/write only – it holds a token).
+    """
+    cache = _load_cache()
+    cache.update(entries)
+    try:
+        fd = os.open(CACHE_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(orjson.dumps(cache))
+    except OSError as e:
+        logging.warning(f"Could not write cache {CACHE_FILE}: {e}")
+
 def get_token():
+    """
+    Bearer token for ARM, served from CACHE_FILE until it is close to expiry.
+    """
+    cached = _load_cache().get("token")
+    if cached and time.time() < cached["expires_on"] - TOKEN_SLACK:
+        return cached["token"]
+
     # Try to use environment variables first (for Kubernetes deployment)
     if "AZURE_TENANT_ID" in os.environ and "AZURE_CLIENT_ID" in os.environ and "AZURE_CLIENT_SECRET" in os.environ:
         logging.info("Using Azure credentials from environment variables")
-        credential = ClientSecretCredential(
+        cred = ClientSecretCredential(
             tenant_id=os.environ.get("AZURE_TENANT_ID"),
             client_id=os.environ.get("AZURE_CLIENT_ID"),
             client_secret=os.environ.get("AZURE_CLIENT_SECRET")
         )
-        token = credential.get_token("https://management.azure.com/.default").token
-        return token
-    # Fallback to AzureCliCredential for local development
-    logging.info("Using Azure CLI credentials")
-    cred = AzureCliCredential()
-    token = cred.get_token("https://management.azure.com/.default").token
-    return token
-
-def query_cost(token, start, end, grouping):
+    else:
+        # Fallback to AzureCliCredential for local development
+        logging.info("Using Azure CLI credentials")
+        cred = AzureCliCredential()
+    access = cred.get_token("https://management.azure.com/.default")
+    _update_cache(token={"token": access.token, "expires_on": access.expires_on})
+    return access.token
+
+def cost_query_body(start, end, groupings):
     """
-    Make one CostManagement/query call.
-    Retry once on 429 after SHORT_SLEEP.
+    Body of a CostManagement/query call summing PreTaxCost over the
+    date range, grouped by the given groupings.
     """
-    body = {
-        "type": "Usage",
-        "timeframe": "Custom",
+    return {
+        **_BODY_TEMPLATE,
         "timePeriod": { "from": f"{start}T00:00:00Z", "to": f"{end}T23:59:59Z" },
-        "dataset": {
-            "granularity": "None",
-            "aggregation": {
-                "totalCost": { "name": "PreTaxCost", "function": "Sum" }
-            },
-            "grouping": [ grouping ]
-        }
-    }
-    url = (
-        f"https://management.azure.com"
-        f"/subscriptions/{SUBSCRIPTION_ID}"
-        f"/providers/Microsoft.CostManagement/query"
-        f"?api-version={API_VERSION}"
-    )
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type":  "application/json"
+        "dataset": { **_BODY_TEMPLATE["dataset"], "grouping": groupings }
     }
 
-    for attempt in (1, 2):
-        resp = requests.post(url, headers=headers, json=body)
-        if resp.status_code == 429 and attempt == 1:
-            print(f"⚠️  429 on {grouping['name']}, backing off for {SHORT_SLEEP}s…")
-            time.sleep(SHORT_SLEEP)
-            continue
-        try:
-            resp.raise_for_status()
-        except HTTPError:
-            print(f"\n❌  ERROR for grouping '{grouping['name']}' →", resp.status_code)
-            print(resp.text, "\n")
-            raise
-        return resp.json()
-
-def query_project_by_region(token, start, end):
+def _ratelimit_headers(headers, marker):
     """
-    Query costs grouped by project tag and resource location.
+    Integer values of the x-ms-ratelimit-* headers whose name contains `marker`.
     """
-    body = {
-        "type": "Usage",
-        "timeframe": "Custom",
-        "timePeriod": { "from": f"{start}T00:00:00Z", "to": f"{end}T23:59:59Z" },
-        "dataset": {
-            "granularity": "None",
-            "aggregation": {
-                "totalCost": { "name": "PreTaxCost", "function": "Sum" }
-            },
-            "grouping": [
-                {"type": "TagKey", "name": "project"},
-                {"type": "Dimension", "name": "ResourceLocation"}
-            ]
-        }
-    }
-    url = (
-        f"https://management.azure.com"
-        f"/subscriptions/{SUBSCRIPTION_ID}"
-        f"/providers/Microsoft.CostManagement/query"
-        f"?api-version={API_VERSION}"
-    )
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type":  "application/json"
-    }
-    
-    logging.info(f"Querying project by region with body: {json.dumps(body)}")
-
-    for attempt in (1, 2):
-        resp = requests.post(url, headers=headers, json=body)
-        if resp.status_code == 429 and attempt == 1:
-            print(f"⚠️  429 on project by region query, backing off for {LONG_SLEEP}s…")
-            time.sleep(LONG_SLEEP)
-            continue
-        try:
-            resp.raise_for_status()
-            logging.info("Successfully fetched project by region data")
-            return resp.json()
-        except HTTPError:
-            logging.error(f"\n❌  ERROR for project by region query →", resp.status_code)
-            logging.error(resp.text, "\n")
-            if attempt == 1:
-                print(f"Retrying project by region query after {LONG_SLEEP}s...")
-                time.sleep(LONG_SLEEP)
-            else:
-                raise # Raise the error after the second failed attempt
-        except Exception as e:
-             logging.error(f"Unexpected error during project by region query: {str(e)}")
-             raise
+    return [int(v) for k, v in headers.items()
+            if k.lower().startswith("x-ms-ratelimit") and marker in k.lower()
+            and str(v).isdigit()]
 
-    # Fallback if loop finishes without returning/raising (shouldn't happen)
-    logging.error("Query for project by region failed after retries.")
-    return {
-        "properties": {
-            "columns": [
-                {"name": "TagKey"}, {"name": "TagValue"}, {"name": "ResourceLocation"},
-                {"name": "PreTaxCost"}, {"name": "Currency"}
-            ],
-            "rows": []
-        }
-    }
+def _retry_after(headers, default):
+    """
+    Seconds to wait from a Retry-After header, given either as delay-seconds
+    or as an HTTP date; `default` when it is missing or can't be parsed.
+    """
+    value = headers.get("Retry-After")
+    if value is None:
+        return default
+    try:
+        return max(0, int(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return default
 
-def query_project_by_resource(token, start, end):
+class _CostClient:
     """
-    Query costs grouped by project tag and resource ID.
+    One keep-alive session per run, carrying the ARM auth headers, for every
+    CostManagement / Billing call. Retries are handled by post(), so the
+    adapter itself never retries.
     """
-    body = {
-        "type": "Usage",
-        "timeframe": "Custom",
-        "timePeriod": { "from": f"{start}T00:00:00Z", "to": f"{end}T23:59:59Z" },
-        "dataset": {
-            "granularity": "None",
-            "aggregation": {
-                "totalCost": { "name": "PreTaxCost", "function": "Sum" }
-            },
-            "grouping": [
-                {"type": "TagKey", "name": "project"},
-                {"type": "Dimension", "name": "ResourceId"}
-            ]
-        }
-    }
-    url = (
-        f"https://management.azure.com"
-        f"/subscriptions/{SUBSCRIPTION_ID}"
-        f"/providers/Microsoft.CostManagement/query"
-        f"?api-version={API_VERSION}"
-    )
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type":  "application/json"
-    }
-    
-    logging.info(f"Querying project by resource with body: {json.dumps(body)}")
-
-    for attempt in (1, 2):
-        resp = requests.post(url, headers=headers, json=body)
-        if resp.status_code == 429 and attempt == 1:
-            print(f"⚠️  429 on project by resource query, backing off for {LONG_SLEEP}s…")
-            time.sleep(LONG_SLEEP)
-            continue
+    def __init__(self, token):
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4,
+                                                   max_retries=Retry(total=0)))
+        self.session.headers.update({
+            "Authorization":   f"Bearer {token}",
+            "Content-Type":    "application/json",
+            "Accept-Encoding": "gzip"
+        })
+        self.query_url = _QUERY_URL
+
+    def post(self, url, body, label, timeout=60):
+        """
+        POST with exponential backoff + jitter on 429, honouring Retry-After.
+        A 5xx is retried once the same way; any other 4xx fails immediately.
+        After a success, pace the next call only when the remaining quota
+        reported by CostManagement is running low.
+        """
+        server_retries = 1
+        for attempt in range(MAX_ATTEMPTS):
+            resp = self.session.post(url, data=orjson.dumps(body), timeout=timeout)
+            if resp.status_code >= 500 and server_retries:
+                server_retries -= 1
+            elif resp.status_code != 429:
+                break
+            if attempt == MAX_ATTEMPTS - 1:
+                break
+            delay = _retry_after(resp.headers, 0) or \
+                min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"⚠️  {resp.status_code} on {label}, backing off for {delay:.0f}s…")
+            time.sleep(delay)
+
         try:
             resp.raise_for_status()
-            logging.info("Successfully fetched project by resource data")
-            return resp.json()
         except HTTPError:
-            logging.error(f"\n❌  ERROR for project by resource query → {resp.status_code}")
-            logging.error(resp.text)
-            if attempt == 1:
-                print(f"Retrying project by resource query after {LONG_SLEEP}s...")
-                time.sleep(LONG_SLEEP)
-            else:
-                raise # Raise the error after the second failed attempt
-        except Exception as e:
-             logging.error(f"Unexpected error during project by resource query: {str(e)}")
-             raise
+            print(f"\n❌  ERROR for {label} →", resp.status_code)
+            print(resp.text, "\n")
+            raise
 
-    # Fallback if loop finishes without returning/raising (shouldn't happen)
-    logging.error("Query for project by resource failed after retries.")
-    return {
-        "properties": {
-            "columns": [
-                {"name": "TagKey"}, {"name": "TagValue"}, {"name": "ResourceId"},
-                {"name": "PreTaxCost"}, {"name": "Currency"}
-            ],
-            "rows": []
+        remaining = _ratelimit_headers(resp.headers, "remaining")
+        if remaining and min(remaining) < QUOTA_LOW_WATER:
+            reset = _ratelimit_headers(resp.headers, "retry-after")
+            delay = max(reset) if reset else BACKOFF_BASE * (QUOTA_LOW_WATER - min(remaining))
+            print(f"⏱  {min(remaining)} requests left in the quota window, pacing {delay}s…")
+            time.sleep(delay)
+        return resp
+
+    def query(self, start, end, grouping):
+        """
+        Make one CostManagement/query call, backing off on 429.
+        """
+        body  = cost_query_body(start, end, [ grouping ])
+        label = f"grouping '{grouping['name']}'"
+        resp  = self.post(self.query_url, body, label)
+        return self.all_pages(orjson.loads(resp.content), body, label)
+
+    def query_pair(self, start, end, g1, g2):
+        """
+        Query costs grouped by two groupings at once (a dimension pair, or the
+        project tag plus location / resource ID).
+        """
+        body  = cost_query_body(start, end, [g1, g2])
+        label = f"{g1['name']} by {g2['name']} query"
+
+        logging.info(f"Querying {label} with body: {orjson.dumps(body).decode()}")
+
+        resp = self.post(self.query_url, body, label)
+        j = self.all_pages(orjson.loads(resp.content), body, label)
+        logging.info(f"Successfully fetched {label} data")
+        return j
+
+    def all_pages(self, j, body, label):
+        """
+        Follow properties.nextLink, re-POSTing the query body to each link, and
+        append every further page's rows to `j`. Paired queries return one row
+        per value pair, so they can easily fill more than one page.
+        """
+        props = j["properties"]
+        next_link = props.get("nextLink")
+        while next_link:
+            resp = self.post(next_link, body, f"{label} (next page)")
+            page = orjson.loads(resp.content)["properties"]
+            props["rows"].extend(page["rows"])
+            next_link = page.get("nextLink")
+        if "nextLink" in props:
+            props["nextLink"] = None
+        return j
+
+    def batch(self, queries):
+        """
+        Send several CostManagement/query calls in a single ARM batch request.
+
+        `queries` maps an output key to a query body. Returns a dict mapping each
+        key to its (httpStatusCode, content) sub-response.
+        """
+        payload = {
+            "requests": [
+                {"name": key, "httpMethod": "POST", "url": QUERY_PATH, "content": body}
+                for key, body in queries.items()
+            ]
         }
-    }
-
-def get_current_billing_period(token):
-    """
-    Returns the open billing period for the subscription.
-
-    Result:
-        {"name": "202504-1",
-         "start": "2025-04-01",
-         "end":   "2025-05-01"}   # inclusive
-    """
-    url = (f"https://management.azure.com/subscriptions/{SUBSCRIPTION_ID}"
-           f"/providers/Microsoft.Billing/billingPeriods"
-           "?api-version=2018-03-01-preview&$top=6")   # a few periods are plenty
-    headers = {"Authorization": f"Bearer {token}"}
-
-    resp = requests.get(url, headers=headers, timeout=30)
-    resp.raise_for_status()
-    today = datetime.date.today()
 
-    for period in resp.json().get("value", []):
-        props = period.get("properties", {})
-        start = datetime.datetime.strptime(
-                    props["billingPeriodStartDate"], "%Y-%m-%d").date()
-        # API's end date is *exclusive* – subtract one day to make it inclusive
-        end_exclusive = datetime.datetime.strptime(
-                    props["billingPeriodEndDate"], "%Y-%m-%d").date()
-        end = end_exclusive - datetime.timedelta(days=1)
-
-        if start <= today <= end:
-            return {
-                "name": period["name"],
-                "start": start.isoformat(),
-                "end":   end.isoformat()
+        resp = self.post(BATCH_URL, payload, "batch query", timeout=120)
+        # Large batches may be accepted for async processing – poll until done
+        while resp.status_code == 202:
+            time.sleep(_retry_after(resp.headers, BATCH_POLL_SLEEP))
+            resp = self.session.get(resp.headers["Location"], timeout=120)
+        resp.raise_for_status()
+
+        results = {}
+        for key, sub in zip(queries, orjson.loads(resp.content)["responses"]):
+            results[sub.get("name", key)] = (sub["httpStatusCode"], sub.get("content"))
+        return results
+
+    def billing_period(self):
+        """
+        Returns the open billing period for the subscription.
+
+        Result:
+            {"name": "202504-1",
+             "start": "2025-04-01",
+             "end":   "2025-05-01"}   # inclusive
+
+        Periods change monthly, so a cached period that still covers today
+        is returned without calling the Billing API.
+        """
+        today = datetime.date.today()
+        cached = _load_cache().get("billing_period")
+        if cached and cached["start"] <= today.isoformat() <= cached["end"]:
+            return cached
+
+        url = (f"https://management.azure.com/subscriptions/{SUBSCRIPTION_ID}"
+               f"/providers/Microsoft.Billing/billingPeriods"
+               "?api-version=2018-03-01-preview&$top=6")   # a few periods are plenty
+
+        resp = self.session.get(url, timeout=30)
+        resp.raise_for_status()
+
+        for period in orjson.loads(resp.content).get("value", []):
+            props = period.get("properties", {})
+            start = datetime.date.fromisoformat(props["billingPeriodStartDate"])
+            # API's end date is *exclusive* – subtract one day to make it inclusive
+            end_exclusive = datetime.date.fromisoformat(props["billingPeriodEndDate"])
+            end = end_exclusive - datetime.timedelta(days=1)
+
+            if start <= today <= end:
+                current = {
+                    "name": period["name"],
+                    "start": start.isoformat(),
+                    "end":   end.isoformat()
+                }
+                _update_cache(billing_period=current)
+                return current
+
+        return None
+
+    def billing_total(self, start_date=None, end_date=None):
+        """
+        Query the total cost for the given date range.
+        If start_date and end_date are provided, use them for a Custom timeframe.
+        Otherwise, fall back to the BillingMonthToDate timeframe.
+        """
+        if start_date and end_date:
+            # Use the provided dates for the billing cycle
+            body = {
+                **_BODY_TEMPLATE,
+                "timePeriod": {
+                    "from": f"{start_date}T00:00:00Z",
+                    "to": f"{end_date}T23:59:59Z"
+                }
             }
+            print(f"ℹ️  Querying total cost for period: {start_date} to {end_date}")
+        else:
+            # Fallback to BillingMonthToDate if dates are not available
+            print("⚠️  Billing period dates not found, falling back to BillingMonthToDate.")
+            body = {**_BODY_TEMPLATE, "timeframe": "BillingMonthToDate"}
 
-    return None 
+        resp = self.post(self.query_url, body, "billing-cycle total", timeout=30)
 
-def query_billing_cycle_total(token, start_date=None, end_date=None):
-    """
-    Query the total cost for the given date range.
-    If start_date and end_date are provided, use them for a Custom timeframe.
-    Otherwise, fall back to the BillingMonthToDate timeframe.
-    """
-    # Always query at the subscription scope
-    url = (f"https://management.azure.com/subscriptions/{SUBSCRIPTION_ID}"
-           f"/providers/Microsoft.CostManagement/query"
-           f"?api-version={API_VERSION}")
-
-    if start_date and end_date:
-        # Use the provided dates for the billing cycle
-        body = {
-            "type": "Usage",
-            "timeframe": "Custom",
-            "timePeriod": {
-                "from": f"{start_date}T00:00:00Z",
-                "to": f"{end_date}T23:59:59Z"
-            },
-            "dataset": {
-                "granularity": "None",
-                "aggregation": {"totalCost": {
-                    "name": "PreTaxCost", "function": "Sum"}}
-            }
-        }
-        print(f"ℹ️  Querying total cost for period: {start_date} to {end_date}")
-    else:
-        # Fallback to BillingMonthToDate if dates are not available
-        print("⚠️  Billing period dates not found, falling back to BillingMonthToDate.")
-        body = {
-            "type": "Usage",
-            "timeframe": "BillingMonthToDate",
-            "dataset": {
-                "granularity": "None",
-                "aggregation": {"totalCost": {
-                    "name": "PreTaxCost", "function": "Sum"}}
-            }
+        rows = orjson.loads(resp.content)["properties"]["rows"]
+        return {
+            "total_cost": rows[0][0] if rows else 0,
+            "currency":   rows[0][1] if rows else "USD"
         }
 
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-
-    resp = requests.post(url, headers=headers, json=body, timeout=30)
-    resp.raise_for_status()
-
-    rows = resp.json()["properties"]["rows"]
-    return {
-        "total_cost": rows[0][0] if rows else 0,
-        "currency":   rows[0][1] if rows else "USD"
-    }
-
 def json_to_df(j):
+    """
+    Build a DataFrame column by column: "Number" columns become float64
+    arrays, everything else stays object, so pandas skips per-cell inference.
+    """
+    # Imported here so a cron run only pays for numpy/pandas once it has
+    # responses to split (see collapse)
+    import numpy as np
+    import pandas as pd
+
     props = j["properties"]
-    cols  = [c["name"] for c in props["columns"]]
     rows  = props["rows"]
-    return pd.DataFrame(rows, columns=cols)
+    data  = {}
+    for i, col in enumerate(props["columns"]):
+        if col.get("type", "String") == "Number":
+            data[col["name"]] = np.fromiter(
+                (np.nan if r[i] is None else r[i] for r in rows),
+                dtype=np.float64, count=len(rows))
+        else:
+            data[col["name"]] = np.fromiter(
+                (r[i] for r in rows), dtype=object, count=len(rows))
+    return pd.DataFrame(data, copy=False)
+
+def collapse(j, keep):
+    """
+    Re-aggregate a multi-grouping CostManagement response onto the `keep`
+    columns, returning a response shaped like the single-grouping query.
+    """
+    props = j["properties"]
+    names = [c["name"] for c in props["columns"]]
+    dropped = [n for n in names if n not in keep and n not in ("PreTaxCost", "Currency")]
+    columns = [c for c in props["columns"] if c["name"] not in dropped]
+    by = [c["name"] for c in columns if c["name"] != "PreTaxCost"]
+
+    summed = (json_to_df(j)
+              .groupby(by, sort=False, dropna=False)["PreTaxCost"].sum()
+              .reset_index())
+    rows = [list(r) for r in zip(*(summed[c["name"]].tolist() for c in columns))]
+    return {**j, "properties": {**props, "columns": columns, "rows": rows}}
+
+def save_json(fs, name, data):
+    json_fn = f"{OUTPUT_DIR}/{name}.json"
+    try:
+        with fs.open(json_fn, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        print(f"💾  Wrote JSON to MinIO: {json_fn}")
+    except Exception as e:
+        logging.error(f"Error saving {name} to MinIO: {str(e)}")
+
+def save_raw(fs, name, data):
+    """
+    Write a raw query response as compact JSON compressed to {name}.json.zst
+    (read back with load_raw in the dashboard).
+    """
+    raw_fn = f"{OUTPUT_DIR}/{name}.json.zst"
+    try:
+        with fs.open(raw_fn, "wb") as f:
+            f.write(RAW_COMPRESSOR.compress(orjson.dumps(data)))
+        print(f"💾  Wrote raw JSON to MinIO: {raw_fn}")
+    except Exception as e:
+        logging.error(f"Error saving {name} to MinIO: {str(e)}")
 
 def main(tag_keys):
     # ── 1.  Prep ────────────────────────────────────────────────────────────────
     start, end = get_last_week_range()
-    token      = get_token()
+    client     = _CostClient(get_token())
     s_iso, e_iso = start.isoformat(), end.isoformat()
     
     # Initialize MinIO connection
@@ -344,118 +467,93 @@ def main(tag_keys):
     except Exception as e:
         logging.error(f"Error creating directory in MinIO: {str(e)}")
 
-    # Dimensions to query
-    dims = [
-        {"type": "Dimension", "name": "ResourceGroupName"},
-        {"type": "Dimension", "name": "MeterCategory"},
-        {"type": "Dimension", "name": "MeterSubCategory"},
-        {"type": "Dimension", "name": "ResourceType"},
-        {"type": "TagKey",    "name": "project"},
-        {"type": "Dimension", "name": "ResourceLocation"},
-    ]
-    for tag in tag_keys:
-        if tag.lower() != "project":
-            dims.append({"type": "TagKey", "name": tag})
-
-    # ── 2.  Weekly grouping queries (updated to use MinIO) ────────────────────────────────
-    for idx, g in enumerate(dims,  start=1):
-        key = g["name"]
-        print(f"\n→ Querying grouping by {key} …")
-        j = query_cost(token, s_iso, e_iso, g)
-
-        json_fn = f"{OUTPUT_DIR}/raw_{key}.json"
-        try:
-            with fs.open(json_fn, "w") as f:
-                json.dump(j, f, indent=2)
-            print(f"💾  Wrote JSON to MinIO: {json_fn}")
-        except Exception as e:
-            logging.error(f"Error saving to MinIO: {str(e)}")
+    # Extra tag keys are queried on their own; the standard dimensions come
+    # from PAIRED_GROUPINGS / PROJECT_GROUPINGS via DERIVED_GROUPINGS
+    dims = [{"type": "TagKey", "name": tag} for tag in tag_keys if tag.lower() != "project"]
 
-        if idx % CALLS_BEFORE_LONG == 0 and idx < len(dims):
-            print(f"⏱  Done {CALLS_BEFORE_LONG} calls—sleeping {LONG_SLEEP}s…")
-            time.sleep(LONG_SLEEP)
-        elif idx < len(dims):
-            print(f"⏱  Sleeping {SHORT_SLEEP}s before next query…")
-            time.sleep(SHORT_SLEEP)
+    # Weekly grouping + project queries, sent together in one batch
+    queries = {g["name"]: cost_query_body(s_iso, e_iso, [g]) for g in dims}
+    for key, groupings in {**PAIRED_GROUPINGS, **PROJECT_GROUPINGS}.items():
+        queries[key] = cost_query_body(s_iso, e_iso, groupings)
 
-    # ── 3.  Determine current billing period (updated to use MinIO) ─────────────────────────────
-    period = None
-    try:
-        print("\n→ Determining current billing period …")
-        time.sleep(SHORT_SLEEP)
-        period = get_current_billing_period(token)
-        if period:
-            json_fn = f"{OUTPUT_DIR}/billing_cycle_dates.json"
-            try:
-                with fs.open(json_fn, "w") as f:
-                    json.dump(period, f, indent=2)
-                print(f"💾  Wrote JSON to MinIO: {json_fn}")
-                print(f"🗓️  Current billing period: {period['start']} → {period['end']}")
-            except Exception as e:
-                logging.error(f"Error saving billing period to MinIO: {str(e)}")
-        else:
-            print("⚠️  Could not determine current billing period – will fall back to Month-to-Date.")
-    except Exception as e:
-        print(f"⚠️  Error while fetching billing period: {e}")
+    # Single-query fallbacks for sub-requests throttled inside the batch
+    retries = {g["name"]: functools.partial(client.query, s_iso, e_iso, g) for g in dims}
+    for key, pair in {**PAIRED_GROUPINGS, **PROJECT_GROUPINGS}.items():
+        retries[key] = functools.partial(client.query_pair, s_iso, e_iso, *pair)
 
-    # ── 4.  Project costs by region (updated to use MinIO) ────────────────────────────────────────────
-    try:
-        print("\n→ Querying project costs by region …")
-        print(f"⏱  Sleeping {LONG_SLEEP}s before project-by-region query …")
-        time.sleep(LONG_SLEEP)
+    # The calls are independent network waits – keep up to MAX_IN_FLIGHT open
+    with ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT) as pool:
+        print("\n→ Determining current billing period …")
+        period_future = pool.submit(client.billing_period)
+        print(f"\n→ Querying {len(queries)} groupings in one batch: {', '.join(queries)} …")
+        batch_future  = pool.submit(client.batch, queries)
 
-        j = query_project_by_region(token, s_iso, e_iso)
-        json_fn = f"{OUTPUT_DIR}/raw_project_by_region.json"
+        # ── 2.  Determine current billing period ─────────────────────────────
+        period = None
         try:
-            with fs.open(json_fn, "w") as f:
-                json.dump(j, f, indent=2)
-            print(f"💾  Wrote JSON to MinIO: {json_fn}")
+            period = period_future.result()
+            if period:
+                save_json(fs, "billing_cycle_dates", period)
+                print(f"🗓️  Current billing period: {period['start']} → {period['end']}")
+            else:
+                print("⚠️  Could not determine current billing period – will fall back to Month-to-Date.")
         except Exception as e:
-            logging.error(f"Error saving project-by-region to MinIO: {str(e)}")
-    except Exception as e:
-        print(f"⚠️  Error during project-by-region query: {e}")
+            print(f"⚠️  Error while fetching billing period: {e}")
 
-    # ── 5.  Project costs by resource (updated to use MinIO) ──────────────────────────────────────────
-    try:
-        print("\n→ Querying project costs by resource …")
-        print(f"⏱  Sleeping {LONG_SLEEP}s before project-by-resource query …")
-        time.sleep(LONG_SLEEP)
+        # The billing-cycle total only needs the period, not the batch
+        print("\n→ Querying billing-cycle total cost …")
+        total_future = pool.submit(client.billing_total,
+                                   start_date=period["start"] if period else None,
+                                   end_date=period["end"] if period else None)
 
-        j = query_project_by_resource(token, s_iso, e_iso)
-        json_fn = f"{OUTPUT_DIR}/raw_project_by_resource.json"
+        # ── 3.  Weekly grouping + project results ────────────────────────────
         try:
-            with fs.open(json_fn, "w") as f:
-                json.dump(j, f, indent=2)
-            print(f"💾  Wrote JSON to MinIO: {json_fn}")
+            results = batch_future.result()
         except Exception as e:
-            logging.error(f"Error saving project-by-resource to MinIO: {str(e)}")
-    except Exception as e:
-        print(f"⚠️  Error during project-by-resource query: {e}")
+            print(f"⚠️  Error during batch query: {e}")
+            results = {}
+
+        responses, pending = {}, {}
+        for key, (status, j) in results.items():
+            if status == 429:
+                print(f"⚠️  429 on {key} in batch, retrying on its own …")
+                pending[key] = pool.submit(retries[key])
+            elif status != 200:
+                print(f"\n❌  ERROR for grouping '{key}' → {status}")
+                print(j, "\n")
+            elif j["properties"].get("nextLink"):
+                # Too many rows for one response – fetch the remaining pages
+                pending[key] = pool.submit(client.all_pages, j, queries[key], key)
+            else:
+                responses[key] = j
 
-    # ── 6.  Accurate billing-cycle total (updated to use MinIO) ────────────────────────────────
-    try:
-        print("\n→ Querying billing-cycle total cost …")
-        print(f"⏱  Sleeping {LONG_SLEEP}s before billing-cycle-total query …")
-        time.sleep(LONG_SLEEP)
+        for key, future in pending.items():
+            try:
+                responses[key] = future.result()
+            except Exception as e:
+                print(f"⚠️  Error during {key} query: {e}")
 
-        # Pass start and end dates if the period was found
-        start_billing = period["start"] if period else None
-        end_billing = period["end"] if period else None
-        billing_total = query_billing_cycle_total(token,
-                                                  start_date=start_billing,
-                                                  end_date=end_billing)
+        for key, j in responses.items():
+            if key not in PAIRED_GROUPINGS:
+                save_raw(fs, f"raw_{key}", j)
 
-        json_fn = f"{OUTPUT_DIR}/billing_cycle_total.json"
+        # Single-dimension views, split out of the paired/project queries
+        for key, (source, keep) in DERIVED_GROUPINGS.items():
+            if source not in responses:
+                continue
+            try:
+                save_raw(fs, f"raw_{key}", collapse(responses[source], keep))
+            except Exception as e:
+                print(f"⚠️  Error deriving {key} from {source}: {e}")
+
+        # ── 4.  Accurate billing-cycle total ──────────────────────────────────
         try:
-            with fs.open(json_fn, "w") as f:
-                json.dump(billing_total, f, indent=2)
-            print(f"💾  Wrote JSON to MinIO: {json_fn}")
+            billing_total = total_future.result()
+            save_json(fs, "billing_cycle_total", billing_total)
             print(f"✅ Billing-cycle total so far: "
                   f"{billing_total['currency']} {billing_total['total_cost']:.2f}")
         except Exception as e:
-            logging.error(f"Error saving billing-cycle-total to MinIO: {str(e)}")
-    except Exception as e:
-        print(f"⚠️  Error during billing-cycle-total query: {e}")
+            print(f"⚠️  Error during billing-cycle-total query: {e}")
 
 
 if __name__ == "__main__":
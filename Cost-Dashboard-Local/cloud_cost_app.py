@@ -3,19 +3,38 @@ import os
 import json
 import datetime
 import pandas as pd
+import polars as pl
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+from matplotlib import font_manager
 import boto3
 from azure.identity import AzureCliCredential
 import requests
 import time
 import io
-import base64
 from matplotlib.backends.backend_pdf import PdfPages
 from reportlab.lib.pagesizes import letter, landscape
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
-import tempfile
+
+# Matplotlib style shared by every chart: resolve the font once and skip the
+# per-figure autolayout pass (PDF charts use fixed margins instead)
+plt.rcParams.update({
+    "figure.autolayout": False,
+    "font.family": "DejaVu Sans",
+    "pdf.fonttype": 42,
+    "path.simplify_threshold": 1.0,
+})
+# Warm the font cache once so the first chart draw doesn't pay for the lookup
+font_manager.findfont(plt.rcParams["font.family"][0])
+
+# PDF bar charts are drawn at the size they are placed in the report (450x250 pt),
+# with fixed margins (room on the left for long labels)
+PDF_CHART_DPI = 72
+PDF_CHART_SIZE = (6.25, 3.47)
+PDF_CHART_MARGINS = {"left": 0.3, "right": 0.95, "bottom": 0.18, "top": 0.92}
 
 # Page configuration
 st.set_page_config(
@@ -50,52 +69,52 @@ st.info(f"Displaying cloud costs from {start_date} to {end_date}")
 tab1, tab2, tab3 = st.tabs(["AWS Costs", "Azure Costs", "Combined View"])
 
 # ----- AWS Cost Functions -----
+# Cached for an hour so widget reruns don't repeat the Cost Explorer calls.
+# Errors propagate (and so are never cached) – the caller reports them.
+@st.cache_data(ttl=3600, show_spinner=False)
 def get_aws_costs(start_date, end_date, profile_name, metrics, include_all_cost_types=True):
     """Fetch AWS cost data"""
-    try:
-        client = boto3.Session(profile_name=profile_name).client("ce")
-        
-        # Base parameters
-        params = {
-            "TimePeriod": {"Start": start_date, "End": end_date},
-            "Granularity": "DAILY",
-            "Metrics": metrics
-        }
-        
-        # Add filter for all cost types if requested
-        if include_all_cost_types:
-            params["Filter"] = {
-                "Dimensions": {
-                    "Key": "RECORD_TYPE",
-                    "Values": [
-                        "Usage", "Tax", "Refund", "Credit", "Discount", "DiscountedUsage", 
-                        "SavingsPlanNegation", "SavingsPlanUpfrontFee", "SavingsPlanRecurringFee"
-                    ]
-                }
+    client = boto3.Session(profile_name=profile_name).client("ce")
+    
+    # Base parameters
+    params = {
+        "TimePeriod": {"Start": start_date, "End": end_date},
+        "Granularity": "DAILY",
+        "Metrics": metrics
+    }
+    
+    # Add filter for all cost types if requested
+    if include_all_cost_types:
+        params["Filter"] = {
+            "Dimensions": {
+                "Key": "RECORD_TYPE",
+                "Values": [
+                    "Usage", "Tax", "Refund", "Credit", "Discount", "DiscountedUsage", 
+                    "SavingsPlanNegation", "SavingsPlanUpfrontFee", "SavingsPlanRecurringFee"
+                ]
             }
-        
-        # Get total costs
-        total_response = client.get_cost_and_usage(**params)
-        
-        # Get costs by service
-        service_params = params.copy()
-        service_params["GroupBy"] = [{"Type": "DIMENSION", "Key": "SERVICE"}]
-        service_response = client.get_cost_and_usage(**service_params)
-        
-        # Get costs by project tag
-        project_params = params.copy()
-        project_params["GroupBy"] = [{"Type": "TAG", "Key": "Project"}]
-        project_response = client.get_cost_and_usage(**project_params)
-        
-        return {
-            "total": total_response,
-            "service": service_response,
-            "project": project_response
         }
-    except Exception as e:
-        st.error(f"Error fetching AWS costs: {str(e)}")
-        return None
+    
+    # Get total costs
+    total_response = client.get_cost_and_usage(**params)
+    
+    # Get costs by service
+    service_params = params.copy()
+    service_params["GroupBy"] = [{"Type": "DIMENSION", "Key": "SERVICE"}]
+    service_response = client.get_cost_and_usage(**service_params)
+    
+    # Get costs by project tag
+    project_params = params.copy()
+    project_params["GroupBy"] = [{"Type": "TAG", "Key": "Project"}]
+    project_response = client.get_cost_and_usage(**project_params)
+    
+    return {
+        "total": total_response,
+        "service": service_response,
+        "project": project_response
+    }
 
+@st.cache_data(show_spinner=False)
 def process_aws_data(aws_data, metric="AmortizedCost"):
     """Process AWS cost data for display"""
     if not aws_data:
@@ -118,7 +137,8 @@ def process_aws_data(aws_data, metric="AmortizedCost"):
             cost = float(group["Metrics"][metric]["Amount"])
             service_data.append({"Service": service, "Cost": cost})
     
-    service_df = pd.DataFrame(service_data).groupby("Service").sum().reset_index()
+    service_df = pd.DataFrame(service_data).astype({"Service": "category"})
+    service_df = service_df.groupby("Service", observed=True).sum().reset_index()
     service_df = service_df.sort_values("Cost", ascending=False)
     
     # Process project costs
@@ -135,70 +155,67 @@ def process_aws_data(aws_data, metric="AmortizedCost"):
     return daily_df, service_df, project_df
 
 # ----- Azure Cost Functions -----
+# Token is shared across reruns and refreshed before the ~1h expiry
+# (a failed login raises instead of caching None for every session)
+@st.cache_resource(ttl=3000, show_spinner=False)
 def get_azure_token():
     """Get Azure authentication token"""
-    try:
-        cred = AzureCliCredential()
-        token = cred.get_token("https://management.azure.com/.default").token
-        return token
-    except Exception as e:
-        st.error(f"Error getting Azure token: {str(e)}")
-        return None
+    cred = AzureCliCredential()
+    token = cred.get_token("https://management.azure.com/.default").token
+    return token
 
+@st.cache_data(ttl=3600, show_spinner=False)
 def get_azure_costs(token, subscription_id, start_date, end_date):
     """Fetch Azure cost data"""
     if not token:
         return None
     
-    try:
-        # Base parameters
-        url = f"https://management.azure.com/subscriptions/{subscription_id}/providers/Microsoft.CostManagement/query?api-version=2023-03-01"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
-        # Dimensions to query
-        dimensions = [
-            {"type": "Dimension", "name": "ResourceGroupName"},
-            {"type": "Dimension", "name": "ServiceName"},
-            {"type": "TagKey", "name": "project"}
-        ]
-        
-        results = {}
-        
-        for dim in dimensions:
-            body = {
-                "type": "Usage",
-                "timeframe": "Custom",
-                "timePeriod": {
-                    "from": f"{start_date}T00:00:00Z",
-                    "to": f"{end_date}T23:59:59Z"
+    # Base parameters
+    url = f"https://management.azure.com/subscriptions/{subscription_id}/providers/Microsoft.CostManagement/query?api-version=2023-03-01"
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+    
+    # Dimensions to query
+    dimensions = [
+        {"type": "Dimension", "name": "ResourceGroupName"},
+        {"type": "Dimension", "name": "ServiceName"},
+        {"type": "TagKey", "name": "project"}
+    ]
+    
+    results = {}
+    
+    for dim in dimensions:
+        body = {
+            "type": "Usage",
+            "timeframe": "Custom",
+            "timePeriod": {
+                "from": f"{start_date}T00:00:00Z",
+                "to": f"{end_date}T23:59:59Z"
+            },
+            "dataset": {
+                "granularity": "Daily",
+                "aggregation": {
+                    "totalCost": {
+                        "name": "PreTaxCost",
+                        "function": "Sum"
+                    }
                 },
-                "dataset": {
-                    "granularity": "Daily",
-                    "aggregation": {
-                        "totalCost": {
-                            "name": "PreTaxCost",
-                            "function": "Sum"
-                        }
-                    },
-                    "grouping": [dim]
-                }
+                "grouping": [dim]
             }
-            
-            resp = requests.post(url, headers=headers, json=body)
-            resp.raise_for_status()
-            results[dim["name"]] = resp.json()
-            
-            # Be nice to the API
-            time.sleep(1)
+        }
         
-        return results
-    except Exception as e:
-        st.error(f"Error fetching Azure costs: {str(e)}")
-        return None
+        resp = requests.post(url, headers=headers, json=body)
+        resp.raise_for_status()
+        results[dim["name"]] = resp.json()
+        
+        # Be nice to the API
+        time.sleep(1)
+    
+    return results
 
+@st.cache_data(show_spinner=False)
 def process_azure_data(azure_data):
     """Process Azure cost data for display"""
     if not azure_data:
@@ -213,6 +230,7 @@ def process_azure_data(azure_data):
         rg_df = rg_df.rename(columns={c: "Cost" for c in rg_df.columns if "cost" in c.lower()})
         rg_df = rg_df[["ResourceGroupName", "Cost", "Currency"]]
         rg_df["Cost"] = pd.to_numeric(rg_df["Cost"])
+        rg_df = rg_df.astype({"ResourceGroupName": "category", "Currency": "category"})
         rg_df = rg_df.sort_values("Cost", ascending=False)
     else:
         rg_df = None
@@ -226,6 +244,7 @@ def process_azure_data(azure_data):
         service_df = service_df.rename(columns={c: "Cost" for c in service_df.columns if "cost" in c.lower()})
         service_df = service_df[["ServiceName", "Cost", "Currency"]]
         service_df["Cost"] = pd.to_numeric(service_df["Cost"])
+        service_df = service_df.astype({"ServiceName": "category", "Currency": "category"})
         service_df = service_df.sort_values("Cost", ascending=False)
     else:
         service_df = None
@@ -256,31 +275,63 @@ def process_azure_data(azure_data):
     
     return rg_df, service_df, project_df
 
+# ----- Display Helpers -----
+def with_total(df, label_col, **totals):
+    """Return a copy of df with a TOTAL row appended for display.
+
+    Cost is summed and Currency carried over when present; keyword arguments
+    override individual cells of the total row.
+    """
+    display_df = df.reset_index(drop=True)
+    if isinstance(display_df[label_col].dtype, pd.CategoricalDtype):
+        display_df[label_col] = display_df[label_col].astype(object)
+    total = dict.fromkeys(display_df.columns)
+    total[label_col] = "TOTAL"
+    if "Cost" in display_df.columns:
+        total["Cost"] = display_df["Cost"].to_numpy().sum()
+    if "Currency" in display_df.columns and len(display_df) > 0:
+        total["Currency"] = display_df["Currency"].iloc[0]
+    total.update(totals)
+    display_df.loc[len(display_df)] = [total[col] for col in display_df.columns]
+    return display_df
+
+def provider_pie_labels(aws_cost, azure_cost):
+    """Precomputed name + percentage labels for the AWS vs Azure pie (skips the autopct pass)"""
+    total = aws_cost + azure_cost
+    aws_pct = aws_cost / total * 100 if total else 0.0
+    return [f"AWS\n{aws_pct:.1f}%", f"Azure\n{100 - aws_pct:.1f}%"]
+
 # ----- PDF Generation Functions -----
 def fig_to_buffer(fig):
     """Convert a matplotlib figure to a bytes buffer"""
     buf = io.BytesIO()
-    fig.savefig(buf, format='png', bbox_inches='tight', dpi=300)
+    fig.savefig(buf, format='png', dpi=PDF_CHART_DPI, bbox_inches=None, pad_inches=0)
     buf.seek(0)
     return buf
 
-def dataframe_to_table_data(df, include_total=True):
-    """Convert a pandas DataFrame to a list of lists for ReportLab Table"""
-    # Convert DataFrame to list of lists
-    data = [df.columns.tolist()]
-    for _, row in df.iterrows():
-        data.append(row.tolist())
+def dataframe_to_table_data(df, label_col):
+    """Build ReportLab Table rows (header, data, TOTAL) straight from the DataFrame"""
+    columns = [label_col, "Cost"] + [c for c in ("Currency", "Cloud") if c in df.columns]
+    
+    # Total row: summed cost, first currency, "All" clouds
+    total = {label_col: "TOTAL", "Cost": df["Cost"].sum()}
+    if "Currency" in df.columns:
+        total["Currency"] = df["Currency"].iloc[0]
+    if "Cloud" in df.columns:
+        total["Cloud"] = "All"
+    
+    data = [columns] + df[columns].values.tolist() + [[total[c] for c in columns]]
     
     # Format values (especially floats/costs)
-    for i in range(1, len(data)):
-        for j in range(len(data[i])):
-            if isinstance(data[i][j], float):
-                data[i][j] = f"${data[i][j]:.2f}"
+    for row in data[1:]:
+        for j, value in enumerate(row):
+            if isinstance(value, float):
+                row[j] = f"${value:.2f}"
     
     return data
 
-def save_as_pdf(aws_data, azure_data, combined_data, filename="cloud_costs_report.pdf"):
-    """Generate a comprehensive PDF report with all cloud cost data"""
+def save_as_pdf(aws_data, azure_data, combined_data):
+    """Generate a comprehensive PDF report with all cloud cost data and return it as bytes"""
     
     # Initialize variables that might be referenced later but aren't defined
     aws_account_df = None
@@ -295,8 +346,13 @@ def save_as_pdf(aws_data, azure_data, combined_data, filename="cloud_costs_repor
     azure_rg_df, azure_service_df, azure_project_df = azure_data
     aws_total, azure_total, combined_total, combined_project_df, aws_vs_azure_fig, project_comparison_fig = combined_data
     
-    # Create a PDF document
-    doc = SimpleDocTemplate(filename, pagesize=letter)
+    # One figure is reused for every bar chart; each block clears the axes and redraws
+    fig, ax = plt.subplots(figsize=PDF_CHART_SIZE)
+    fig.subplots_adjust(**PDF_CHART_MARGINS)
+    
+    # Create a PDF document in memory
+    pdf_buffer = io.BytesIO()
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=letter)
     elements = []
     styles = getSampleStyleSheet()
     
@@ -345,34 +401,16 @@ def save_as_pdf(aws_data, azure_data, combined_data, filename="cloud_costs_repor
             elements.append(Paragraph("AWS Account Costs", styles["Heading2"]))
             
             # Create horizontal bar chart for costs by account
-            fig, ax = plt.subplots(figsize=(8, 4))
+            ax.clear()
             ax.barh(aws_account_df["Account"], aws_account_df["Cost"])
             ax.set_xlabel("Cost ($)")
-            plt.tight_layout()
             
             buf = fig_to_buffer(fig)
             img = Image(buf, width=450, height=250)
             elements.append(img)
-            plt.close(fig)
-            
-            # Add table with total row safely
-            total_dict = {"Account": "TOTAL", "Cost": aws_account_df["Cost"].sum()}
-            if "Currency" in aws_account_df.columns:
-                total_dict["Currency"] = aws_account_df["Currency"].iloc[0]
-            
-            aws_account_display = aws_account_df.copy()
-            # Ensure all required columns are present but don't add those that aren't
-            columns_to_include = ["Account", "Cost"]
-            if "Currency" in aws_account_df.columns:
-                columns_to_include.append("Currency")
-            
-            aws_account_display = aws_account_df[columns_to_include].copy()
-            
-            # Add the total row
-            total_row = pd.DataFrame([total_dict])
-            aws_account_with_total = pd.concat([aws_account_display, total_row])
             
-            account_table_data = dataframe_to_table_data(aws_account_with_total)
+            # Add table with total row
+            account_table_data = dataframe_to_table_data(aws_account_df, "Account")
             account_table = Table(account_table_data)
             account_table.setStyle(TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
@@ -392,35 +430,16 @@ def save_as_pdf(aws_data, azure_data, combined_data, filename="cloud_costs_repor
             elements.append(Paragraph("AWS Project Costs", styles["Heading2"]))
             
             # Create horizontal bar chart for costs by project
-            fig, ax = plt.subplots(figsize=(8, 4))
+            ax.clear()
             ax.barh(aws_project_df["Project"], aws_project_df["Cost"])
             ax.set_xlabel("Cost ($)")
-            plt.tight_layout()
             
             buf = fig_to_buffer(fig)
             img = Image(buf, width=450, height=250)
             elements.append(img)
-            plt.close(fig)
             
             # Add table with total row
-            # Add total row safely
-            total_dict = {"Project": "TOTAL", "Cost": aws_project_df["Cost"].sum()}
-            if "Currency" in aws_project_df.columns:
-                total_dict["Currency"] = aws_project_df["Currency"].iloc[0]
-            
-            aws_project_display = aws_project_df.copy()
-            # Ensure all required columns are present but don't add those that aren't
-            columns_to_include = ["Project", "Cost"]
-            if "Currency" in aws_project_df.columns:
-                columns_to_include.append("Currency")
-            
-            aws_project_display = aws_project_df[columns_to_include].copy()
-            
-            # Add the total row
-            total_row = pd.DataFrame([total_dict])
-            aws_project_with_total = pd.concat([aws_project_display, total_row])
-            
-            project_table_data = dataframe_to_table_data(aws_project_with_total)
+            project_table_data = dataframe_to_table_data(aws_project_df, "Project")
             project_table = Table(project_table_data)
             project_table.setStyle(TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
@@ -440,35 +459,16 @@ def save_as_pdf(aws_data, azure_data, combined_data, filename="cloud_costs_repor
             elements.append(Paragraph("AWS Service Costs", styles["Heading2"]))
             
             # Create horizontal bar chart for costs by service
-            fig, ax = plt.subplots(figsize=(8, 4))
+            ax.clear()
             ax.barh(aws_service_df.head(10)["Service"], aws_service_df.head(10)["Cost"])
             ax.set_xlabel("Cost ($)")
-            plt.tight_layout()
             
             buf = fig_to_buffer(fig)
             img = Image(buf, width=450, height=250)
             elements.append(img)
-            plt.close(fig)
             
             # Add table with total row
-            # Add total row safely
-            total_dict = {"Service": "TOTAL", "Cost": aws_service_df["Cost"].sum()}
-            if "Currency" in aws_service_df.columns:
-                total_dict["Currency"] = aws_service_df["Currency"].iloc[0]
-            
-            aws_service_display = aws_service_df.copy()
-            # Ensure all required columns are present but don't add those that aren't
-            columns_to_include = ["Service", "Cost"]
-            if "Currency" in aws_service_df.columns:
-                columns_to_include.append("Currency")
-            
-            aws_service_display = aws_service_df[columns_to_include].copy()
-            
-            # Add the total row
-            total_row = pd.DataFrame([total_dict])
-            aws_service_with_total = pd.concat([aws_service_display, total_row])
-            
-            service_table_data = dataframe_to_table_data(aws_service_with_total)
+            service_table_data = dataframe_to_table_data(aws_service_df, "Service")
             service_table = Table(service_table_data)
             service_table.setStyle(TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
@@ -497,35 +497,16 @@ def save_as_pdf(aws_data, azure_data, combined_data, filename="cloud_costs_repor
             elements.append(Paragraph("Azure Subscription Costs", styles["Heading2"]))
             
             # Create horizontal bar chart for costs by subscription
-            fig, ax = plt.subplots(figsize=(8, 4))
+            ax.clear()
             ax.barh(azure_subscription_df["Subscription"], azure_subscription_df["Cost"])
             ax.set_xlabel("Cost ($)")
-            plt.tight_layout()
             
             buf = fig_to_buffer(fig)
             img = Image(buf, width=450, height=250)
             elements.append(img)
-            plt.close(fig)
             
             # Add table with total row
-            # Add total row safely
-            total_dict = {"Subscription": "TOTAL", "Cost": azure_subscription_df["Cost"].sum()}
-            if "Currency" in azure_subscription_df.columns:
-                total_dict["Currency"] = azure_subscription_df["Currency"].iloc[0]
-            
-            azure_subscription_display = azure_subscription_df.copy()
-            # Ensure all required columns are present but don't add those that aren't
-            columns_to_include = ["Subscription", "Cost"]
-            if "Currency" in azure_subscription_df.columns:
-                columns_to_include.append("Currency")
-            
-            azure_subscription_display = azure_subscription_df[columns_to_include].copy()
-            
-            # Add the total row
-            total_row = pd.DataFrame([total_dict])
-            azure_subscription_with_total = pd.concat([azure_subscription_display, total_row])
-            
-            subscription_table_data = dataframe_to_table_data(azure_subscription_with_total)
+            subscription_table_data = dataframe_to_table_data(azure_subscription_df, "Subscription")
             subscription_table = Table(subscription_table_data)
             subscription_table.setStyle(TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
@@ -545,35 +526,16 @@ def save_as_pdf(aws_data, azure_data, combined_data, filename="cloud_costs_repor
             elements.append(Paragraph("Azure Service Costs", styles["Heading2"]))
             
             # Create horizontal bar chart for costs by service
-            fig, ax = plt.subplots(figsize=(8, 4))
+            ax.clear()
             ax.barh(azure_service_df.head(10)["Service"], azure_service_df.head(10)["Cost"])
             ax.set_xlabel("Cost ($)")
-            plt.tight_layout()
             
             buf = fig_to_buffer(fig)
             img = Image(buf, width=450, height=250)
             elements.append(img)
-            plt.close(fig)
             
             # Add table with total row
-            # Add total row safely
-            total_dict = {"Service": "TOTAL", "Cost": azure_service_df["Cost"].sum()}
-            if "Currency" in azure_service_df.columns:
-                total_dict["Currency"] = azure_service_df["Currency"].iloc[0]
-            
-            azure_service_display = azure_service_df.copy()
-            # Ensure all required columns are present but don't add those that aren't
-            columns_to_include = ["Service", "Cost"]
-            if "Currency" in azure_service_df.columns:
-                columns_to_include.append("Currency")
-            
-            azure_service_display = azure_service_df[columns_to_include].copy()
-            
-            # Add the total row
-            total_row = pd.DataFrame([total_dict])
-            azure_service_with_total = pd.concat([azure_service_display, total_row])
-            
-            service_table_data = dataframe_to_table_data(azure_service_with_total)
+            service_table_data = dataframe_to_table_data(azure_service_df, "Service")
             service_table = Table(service_table_data)
             service_table.setStyle(TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
@@ -593,35 +555,16 @@ def save_as_pdf(aws_data, azure_data, combined_data, filename="cloud_costs_repor
             elements.append(Paragraph("Azure Resource Group Costs", styles["Heading2"]))
             
             # Create horizontal bar chart for costs by resource group
-            fig, ax = plt.subplots(figsize=(8, 4))
+            ax.clear()
             ax.barh(azure_resource_group_df.head(10)["ResourceGroup"], azure_resource_group_df.head(10)["Cost"])
             ax.set_xlabel("Cost ($)")
-            plt.tight_layout()
             
             buf = fig_to_buffer(fig)
             img = Image(buf, width=450, height=250)
             elements.append(img)
-            plt.close(fig)
             
             # Add table with total row
-            # Add total row safely
-            total_dict = {"ResourceGroup": "TOTAL", "Cost": azure_resource_group_df["Cost"].sum()}
-            if "Currency" in azure_resource_group_df.columns:
-                total_dict["Currency"] = azure_resource_group_df["Currency"].iloc[0]
-            
-            azure_resource_group_display = azure_resource_group_df.copy()
-            # Ensure all required columns are present but don't add those that aren't
-            columns_to_include = ["ResourceGroup", "Cost"]
-            if "Currency" in azure_resource_group_df.columns:
-                columns_to_include.append("Currency")
-            
-            azure_resource_group_display = azure_resource_group_df[columns_to_include].copy()
-            
-            # Add the total row
-            total_row = pd.DataFrame([total_dict])
-            azure_resource_group_with_total = pd.concat([azure_resource_group_display, total_row])
-            
-            resource_group_table_data = dataframe_to_table_data(azure_resource_group_with_total)
+            resource_group_table_data = dataframe_to_table_data(azure_resource_group_df, "ResourceGroup")
             resource_group_table = Table(resource_group_table_data)
             resource_group_table.setStyle(TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
@@ -650,39 +593,16 @@ def save_as_pdf(aws_data, azure_data, combined_data, filename="cloud_costs_repor
         elements.append(Paragraph("Combined Cloud Costs by Project", styles["Heading2"]))
         
         # Create combined costs chart
-        fig, ax = plt.subplots(figsize=(8, 4))
+        ax.clear()
         ax.barh(combined_data.head(10)["Project"], combined_data.head(10)["Cost"])
         ax.set_xlabel("Cost ($)")
-        plt.tight_layout()
         
         buf = fig_to_buffer(fig)
         img = Image(buf, width=450, height=250)
         elements.append(img)
-        plt.close(fig)
-        
-        # Add combined costs table
-        # Add total row safely
-        total_dict = {"Project": "TOTAL", "Cost": combined_data["Cost"].sum()}
-        if "Currency" in combined_data.columns:
-            total_dict["Currency"] = combined_data["Currency"].iloc[0]
-        if "Cloud" in combined_data.columns:
-            total_dict["Cloud"] = "All"
-        
-        combined_display = combined_data.copy()
-        # Ensure all required columns are present but don't add those that aren't
-        columns_to_include = ["Project", "Cost"]
-        if "Currency" in combined_data.columns:
-            columns_to_include.append("Currency")
-        if "Cloud" in combined_data.columns:
-            columns_to_include.append("Cloud")
         
-        combined_display = combined_data[columns_to_include].copy()
-        
-        # Add the total row
-        total_row = pd.DataFrame([total_dict])
-        combined_with_total = pd.concat([combined_display, total_row])
-        
-        combined_data = dataframe_to_table_data(combined_with_total)
+        # Add combined costs table with total row
+        combined_data = dataframe_to_table_data(combined_data, "Project")
         combined_table = Table(combined_data)
         combined_table.setStyle(TableStyle([
             ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
@@ -707,35 +627,16 @@ def save_as_pdf(aws_data, azure_data, combined_data, filename="cloud_costs_repor
             elements.append(Paragraph("Google Cloud Project Costs", styles["Heading2"]))
             
             # Create horizontal bar chart for costs by project
-            fig, ax = plt.subplots(figsize=(8, 4))
+            ax.clear()
             ax.barh(gcp_project_df["Project"], gcp_project_df["Cost"])
             ax.set_xlabel("Cost ($)")
-            plt.tight_layout()
             
             buf = fig_to_buffer(fig)
             img = Image(buf, width=450, height=250)
             elements.append(img)
-            plt.close(fig)
             
             # Add table with total row
-            # Add total row safely
-            total_dict = {"Project": "TOTAL", "Cost": gcp_project_df["Cost"].sum()}
-            if "Currency" in gcp_project_df.columns:
-                total_dict["Currency"] = gcp_project_df["Currency"].iloc[0]
-            
-            gcp_project_display = gcp_project_df.copy()
-            # Ensure all required columns are present but don't add those that aren't
-            columns_to_include = ["Project", "Cost"]
-            if "Currency" in gcp_project_df.columns:
-                columns_to_include.append("Currency")
-            
-            gcp_project_display = gcp_project_df[columns_to_include].copy()
-            
-            # Add the total row
-            total_row = pd.DataFrame([total_dict])
-            gcp_project_with_total = pd.concat([gcp_project_display, total_row])
-            
-            project_table_data = dataframe_to_table_data(gcp_project_with_total)
+            project_table_data = dataframe_to_table_data(gcp_project_df, "Project")
             project_table = Table(project_table_data)
             project_table.setStyle(TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
@@ -755,35 +656,16 @@ def save_as_pdf(aws_data, azure_data, combined_data, filename="cloud_costs_repor
             elements.append(Paragraph("Google Cloud Service Costs", styles["Heading2"]))
             
             # Create horizontal bar chart for costs by service
-            fig, ax = plt.subplots(figsize=(8, 4))
+            ax.clear()
             ax.barh(gcp_service_df.head(10)["Service"], gcp_service_df.head(10)["Cost"])
             ax.set_xlabel("Cost ($)")
-            plt.tight_layout()
             
             buf = fig_to_buffer(fig)
             img = Image(buf, width=450, height=250)
             elements.append(img)
-            plt.close(fig)
             
             # Add table with total row
-            # Add total row safely
-            total_dict = {"Service": "TOTAL", "Cost": gcp_service_df["Cost"].sum()}
-            if "Currency" in gcp_service_df.columns:
-                total_dict["Currency"] = gcp_service_df["Currency"].iloc[0]
-            
-            gcp_service_display = gcp_service_df.copy()
-            # Ensure all required columns are present but don't add those that aren't
-            columns_to_include = ["Service", "Cost"]
-            if "Currency" in gcp_service_df.columns:
-                columns_to_include.append("Currency")
-            
-            gcp_service_display = gcp_service_df[columns_to_include].copy()
-            
-            # Add the total row
-            total_row = pd.DataFrame([total_dict])
-            gcp_service_with_total = pd.concat([gcp_service_display, total_row])
-            
-            service_table_data = dataframe_to_table_data(gcp_service_with_total)
+            service_table_data = dataframe_to_table_data(gcp_service_df, "Service")
             service_table = Table(service_table_data)
             service_table.setStyle(TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
@@ -798,17 +680,11 @@ def save_as_pdf(aws_data, azure_data, combined_data, filename="cloud_costs_repor
             elements.append(service_table)
             elements.append(Spacer(1, 12))
     
+    plt.close(fig)
+    
     # Build the PDF
     doc.build(elements)
-    return filename
-
-def get_pdf_download_link(pdf_filename, link_text="Download PDF Report"):
-    """Generate a link to download the PDF file"""
-    with open(pdf_filename, "rb") as f:
-        pdf_data = f.read()
-    b64_pdf = base64.b64encode(pdf_data).decode()
-    href = f'<a href="data:application/pdf;base64,{b64_pdf}" download="{pdf_filename}" target="_blank">{link_text}</a>'
-    return href
+    return pdf_buffer.getvalue()
 
 # ----- Main app logic -----
 with st.spinner("Fetching cloud cost data..."):
@@ -816,7 +692,10 @@ with st.spinner("Fetching cloud cost data..."):
     aws_data = None
     aws_daily_df = aws_service_df = aws_project_df = None
     
-    aws_data = get_aws_costs(start_iso, end_iso, aws_profile, aws_metrics, include_all_aws_cost_types)
+    try:
+        aws_data = get_aws_costs(start_iso, end_iso, aws_profile, aws_metrics, include_all_aws_cost_types)
+    except Exception as e:
+        st.error(f"Error fetching AWS costs: {str(e)}")
     if aws_data:
         aws_daily_df, aws_service_df, aws_project_df = process_aws_data(aws_data, aws_metrics[0])
     
@@ -824,9 +703,16 @@ with st.spinner("Fetching cloud cost data..."):
     azure_data = None
     azure_rg_df = azure_service_df = azure_project_df = None
     
-    azure_token = get_azure_token()
+    azure_token = None
+    try:
+        azure_token = get_azure_token()
+    except Exception as e:
+        st.error(f"Error getting Azure token: {str(e)}")
     if azure_token:
-        azure_data = get_azure_costs(azure_token, azure_subscription, start_iso, end_iso)
+        try:
+            azure_data = get_azure_costs(azure_token, azure_subscription, start_iso, end_iso)
+        except Exception as e:
+            st.error(f"Error fetching Azure costs: {str(e)}")
         if azure_data:
             azure_rg_df, azure_service_df, azure_project_df = process_azure_data(azure_data)
 
@@ -842,19 +728,18 @@ with tab1:
         # Daily trend
         st.subheader("Daily AWS Costs")
         fig, ax = plt.subplots(figsize=(10, 4))
-        ax.bar(aws_daily_df["Date"], aws_daily_df["Cost"])
+        x = range(len(aws_daily_df))
+        ax.bar(x, aws_daily_df["Cost"])
         ax.set_ylabel("Cost ($)")
-        ax.set_xticklabels(aws_daily_df["Date"], rotation=45)
+        ax.set_xticks(x)
+        ax.set_xticklabels(aws_daily_df["Date"], rotation=45, ha="right")
         st.pyplot(fig)
         
         # Services breakdown
         if aws_service_df is not None:
             st.subheader("Costs by Service")
             top_services = aws_service_df.head(15)  # Top 15 services
-            fig, ax = plt.subplots(figsize=(10, 6))
-            ax.barh(top_services["Service"], top_services["Cost"])
-            ax.set_xlabel("Cost ($)")
-            st.pyplot(fig)
+            st.bar_chart(top_services.set_index("Service")["Cost"], horizontal=True)
             
             # Services table
             st.dataframe(aws_service_df.reset_index(drop=True), use_container_width=True, hide_index=True)
@@ -862,17 +747,13 @@ with tab1:
         # Project tag breakdown
         if aws_project_df is not None:
             st.subheader("Costs by Project Tag")
-            fig, ax = plt.subplots(figsize=(10, 6))
-            ax.barh(aws_project_df["Project"], aws_project_df["Cost"])
-            ax.set_xlabel("Cost ($)")
-            st.pyplot(fig)
+            st.bar_chart(aws_project_df.set_index("Project")["Cost"], horizontal=True)
             
             # Add total row
-            total_row = pd.DataFrame([{"Project": "TOTAL", "Cost": aws_project_df["Cost"].sum()}])
-            display_df = pd.concat([aws_project_df, total_row])
+            display_df = with_total(aws_project_df, "Project")
             
             # Project table
-            st.dataframe(display_df.reset_index(drop=True), use_container_width=True, hide_index=True)
+            st.dataframe(display_df, use_container_width=True, hide_index=True)
     else:
         st.info("No AWS cost data available. Please check your AWS profile configuration.")
 
@@ -887,49 +768,37 @@ with tab2:
         
         # Resource Group breakdown
         st.subheader("Costs by Resource Group")
-        fig, ax = plt.subplots(figsize=(10, 6))
         top_rgs = azure_rg_df.head(15)  # Top 15 resource groups
-        ax.barh(top_rgs["ResourceGroupName"], top_rgs["Cost"])
-        ax.set_xlabel("Cost ($)")
-        st.pyplot(fig)
+        st.bar_chart(top_rgs.set_index("ResourceGroupName")["Cost"], horizontal=True)
         
         # Add total row
-        total_row = pd.DataFrame([{"ResourceGroupName": "TOTAL", "Cost": azure_rg_df["Cost"].sum(), "Currency": azure_rg_df["Currency"].iloc[0]}])
-        display_df = pd.concat([azure_rg_df, total_row])
+        display_df = with_total(azure_rg_df, "ResourceGroupName")
         
         # Resource Group table
-        st.dataframe(display_df.reset_index(drop=True), use_container_width=True, hide_index=True)
+        st.dataframe(display_df, use_container_width=True, hide_index=True)
         
         # Service breakdown
         if azure_service_df is not None:
             st.subheader("Costs by Service")
-            fig, ax = plt.subplots(figsize=(10, 6))
             top_services = azure_service_df.head(15)  # Top 15 services
-            ax.barh(top_services["ServiceName"], top_services["Cost"])
-            ax.set_xlabel("Cost ($)")
-            st.pyplot(fig)
+            st.bar_chart(top_services.set_index("ServiceName")["Cost"], horizontal=True)
             
             # Add total row
-            total_row = pd.DataFrame([{"ServiceName": "TOTAL", "Cost": azure_service_df["Cost"].sum(), "Currency": azure_service_df["Currency"].iloc[0]}])
-            display_df = pd.concat([azure_service_df, total_row])
+            display_df = with_total(azure_service_df, "ServiceName")
             
             # Service table
-            st.dataframe(display_df.reset_index(drop=True), use_container_width=True, hide_index=True)
+            st.dataframe(display_df, use_container_width=True, hide_index=True)
         
         # Project tag breakdown
         if azure_project_df is not None:
             st.subheader("Costs by Project Tag")
-            fig, ax = plt.subplots(figsize=(10, 6))
-            ax.barh(azure_project_df["Project"], azure_project_df["Cost"])
-            ax.set_xlabel("Cost ($)")
-            st.pyplot(fig)
+            st.bar_chart(azure_project_df.set_index("Project")["Cost"], horizontal=True)
             
             # Add total row
-            total_row = pd.DataFrame([{"Project": "TOTAL", "Cost": azure_project_df["Cost"].sum(), "Currency": azure_project_df["Currency"].iloc[0]}])
-            display_df = pd.concat([azure_project_df, total_row])
+            display_df = with_total(azure_project_df, "Project")
             
             # Project table
-            st.dataframe(display_df.reset_index(drop=True), use_container_width=True, hide_index=True)
+            st.dataframe(display_df, use_container_width=True, hide_index=True)
     else:
         st.info("No Azure cost data available. Please check your Azure subscription configuration.")
 
@@ -948,9 +817,9 @@ with tab3:
     # Pie chart of AWS vs Azure
     fig, ax = plt.subplots(figsize=(8, 8))
     ax.pie([aws_total, azure_total], 
-           labels=["AWS", "Azure"], 
-           autopct='%1.1f%%',
-           colors=['#FF9900', '#0089D6'])
+           labels=provider_pie_labels(aws_total, azure_total), 
+           colors=['#FF9900', '#0089D6'],
+           wedgeprops={"linewidth": 0})
     ax.set_title("Cost Distribution by Cloud Provider")
     aws_azure_pie_chart = fig  # Save for PDF
     st.pyplot(fig)
@@ -962,43 +831,28 @@ with tab3:
     if aws_project_df is not None and azure_project_df is not None:
         st.subheader("Project Costs Across Clouds")
         
-        # Prepare data
-        aws_project_df_copy = aws_project_df.copy()
-        aws_project_df_copy["Cloud"] = "AWS"
-        aws_project_df_copy = aws_project_df_copy[["Project", "Cost", "Cloud"]]
-        
-        azure_project_df_copy = azure_project_df.copy()
-        azure_project_df_copy["Cloud"] = "Azure"
-        azure_project_df_copy = azure_project_df_copy[["Project", "Cost", "Cloud"]]
-        
-        # Combine
-        combined_projects = pd.concat([aws_project_df_copy, azure_project_df_copy])
-        
-        # Pivot for comparison
-        pivot_df = combined_projects.pivot_table(
-            index="Project", 
-            columns="Cloud", 
-            values="Cost", 
-            aggfunc="sum",
-            fill_value=0
-        ).reset_index()
-        
-        # Calculate totals
-        pivot_df["Total"] = pivot_df["AWS"] + pivot_df["Azure"]
-        pivot_df = pivot_df.sort_values("Total", ascending=False)
+        # Combine both clouds in Polars
+        combined_projects = pl.concat([
+            pl.from_pandas(aws_project_df[["Project", "Cost"]]).with_columns(pl.lit("AWS").alias("Cloud")),
+            pl.from_pandas(azure_project_df[["Project", "Cost"]]).with_columns(pl.lit("Azure").alias("Cloud")),
+        ])
+        
+        # Pivot for comparison, calculate totals and sort
+        pivot_df = (
+            combined_projects
+            .pivot(on="Cloud", index="Project", values="Cost", aggregate_function="sum")
+            .fill_null(0)
+            .with_columns((pl.col("AWS") + pl.col("Azure")).alias("Total"))
+            .sort("Total", descending=True)
+            .to_pandas()
+        )
         combined_pivot_df = pivot_df  # Save for PDF
         
         # Add totals row
-        total_row = pd.DataFrame([{
-            "Project": "TOTAL",
-            "AWS": aws_total,
-            "Azure": azure_total,
-            "Total": combined_total
-        }])
-        display_df = pd.concat([pivot_df, total_row])
+        display_df = with_total(pivot_df, "Project", AWS=aws_total, Azure=azure_total, Total=combined_total)
         
         # Display table
-        st.dataframe(display_df.reset_index(drop=True), use_container_width=True, hide_index=True)
+        st.dataframe(display_df, use_container_width=True, hide_index=True)
         
         # Bar chart comparison
         top_projects = pivot_df.head(10)
@@ -1020,8 +874,9 @@ col1, col2 = st.columns(2)
 
 with col1:
     if st.button("Download Data as Excel"):
-        # Create Excel file
-        with pd.ExcelWriter("cloud_costs.xlsx") as writer:
+        # Create Excel file in memory
+        excel_buffer = io.BytesIO()
+        with pd.ExcelWriter(excel_buffer, engine="xlsxwriter") as writer:
             if aws_service_df is not None:
                 aws_service_df.to_excel(writer, sheet_name="AWS Services", index=False)
             if aws_project_df is not None:
@@ -1031,14 +886,10 @@ with col1:
             if azure_project_df is not None:
                 azure_project_df.to_excel(writer, sheet_name="Azure Projects", index=False)
         
-        # Read the Excel file into bytes for download
-        with open("cloud_costs.xlsx", "rb") as f:
-            excel_data = f.read()
-        
         # Create a download button
         st.download_button(
             label="Download Excel File",
-            data=excel_data,
+            data=excel_buffer.getvalue(),
             file_name="cloud_costs.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
@@ -1046,20 +897,20 @@ with col1:
 with col2:
     if st.button("Generate PDF Report"):
         with st.spinner("Generating PDF report... This may take a moment."):
-            # Create temp file for PDF
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-            pdf_filename = temp_file.name
-            
             # Gather data for PDF
             aws_data = (aws_daily_df, aws_service_df, aws_project_df)
             azure_data = (azure_rg_df, azure_service_df, azure_project_df)
             combined_data = (aws_total, azure_total, combined_total, combined_pivot_df, aws_azure_pie_chart, project_comparison_chart)
             
             # Generate PDF
-            save_as_pdf(aws_data, azure_data, combined_data, pdf_filename)
-            
-            # Create download link
-            pdf_link = get_pdf_download_link(pdf_filename, "Download PDF Report")
-            st.markdown(pdf_link, unsafe_allow_html=True)
+            pdf_bytes = save_as_pdf(aws_data, azure_data, combined_data)
+            
+            # Create a download button
+            st.download_button(
+                label="Download PDF Report",
+                data=pdf_bytes,
+                file_name="cloud_costs_report.pdf",
+                mime="application/pdf"
+            )
             
             st.success("PDF report generated successfully!")
\ No newline at end of file
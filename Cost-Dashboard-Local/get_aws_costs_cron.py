@@ -4,9 +4,11 @@ get_aws_costs.py  –  pull last week's AWS spend, grouped by
                     various dimensions and tags, similar to the Azure cost script.
                     Writes JSON files for each grouping and the billing period total.
 """
-import os, json, time, datetime
-import boto3, pandas as pd, matplotlib.pyplot as plt
+import os, time, datetime, threading, functools
+import boto3, numpy as np, orjson, pandas as pd, matplotlib.pyplot as plt
 import logging
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # ───────── CONFIG ─────────
 PROFILE  = "cost-report"                           # your aws configure profile
@@ -17,31 +19,110 @@ os.makedirs(OUT_DIR, exist_ok=True)
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Single dimension groupings
+# Single dimension groupings that are queried on their own
+# (PLATFORM doesn't combine well with the other dimensions)
 DIMENSIONS = [
-    {"Type": "DIMENSION", "Key": "SERVICE"},
-    {"Type": "DIMENSION", "Key": "LINKED_ACCOUNT"},
-    {"Type": "DIMENSION", "Key": "USAGE_TYPE"},
-    {"Type": "DIMENSION", "Key": "OPERATION"},
-    {"Type": "DIMENSION", "Key": "REGION"},
-    {"Type": "DIMENSION", "Key": "INSTANCE_TYPE"},
     {"Type": "DIMENSION", "Key": "PLATFORM"},
-    {"Type": "TAG",       "Key": "Project"},
 ]
 
+# Multi-dimension groupings, saved as raw_{key}.json
+MULTI_DIMENSIONS = {
+    # Project by Region (similar to Azure's project by region)
+    "project_by_region": [
+        {"Type": "TAG", "Key": "Project"},
+        {"Type": "DIMENSION", "Key": "REGION"}
+    ],
+    # Project by Resource
+    # Note: AWS Cost Explorer doesn't directly expose RESOURCE_ID as a dimension
+    # You can use a resource-id tag if you've set one up
+    "project_by_resource": [
+        {"Type": "TAG", "Key": "Project"},
+        {"Type": "DIMENSION", "Key": "USAGE_TYPE"}  # Change this to match your tagging strategy
+    ],
+}
+
+# Multi-dimension groupings queried only to derive single dimension views from.
+# They are not saved: the dashboard picks AWS files by *service*/*account*
+# globs and would read a two-key pair file as a SERVICE/LINKED_ACCOUNT table.
+PAIRED_DIMENSIONS = {
+    "service_by_account": [
+        {"Type": "DIMENSION", "Key": "SERVICE"},
+        {"Type": "DIMENSION", "Key": "LINKED_ACCOUNT"}
+    ],
+    "operation_by_instance_type": [
+        {"Type": "DIMENSION", "Key": "OPERATION"},
+        {"Type": "DIMENSION", "Key": "INSTANCE_TYPE"}
+    ],
+}
+
+# Single dimension views summed out of the multi-dimension responses instead of
+# being queried separately: key -> (multi-dimension query, position in Keys)
+DERIVED_DIMENSIONS = {
+    "SERVICE":        ("service_by_account", 0),
+    "LINKED_ACCOUNT": ("service_by_account", 1),
+    "USAGE_TYPE":     ("project_by_resource", 1),
+    "OPERATION":      ("operation_by_instance_type", 0),
+    "REGION":         ("project_by_region", 1),
+    "INSTANCE_TYPE":  ("operation_by_instance_type", 1),
+    "Project":        ("project_by_region", 0),
+}
+
 # Throttling settings
-THROTTLE = 1  # seconds between calls (Cost Explorer limit is 5 req/s)
-LONG_THROTTLE = 3  # seconds between multi-dimension calls
+RATE_LIMIT  = 5  # Cost Explorer limit is 5 req/s
+MAX_WORKERS = 4  # concurrent Cost Explorer calls
 
 # ───────── helpers ─────────
+class RateLimiter:
+    """
+    Token bucket shared by all worker threads.
+    Holds up to `rate` tokens and refills one every 1/rate seconds.
+    """
+    def __init__(self, rate):
+        self._tokens = threading.BoundedSemaphore(rate)
+        self._interval = 1.0 / rate
+        threading.Thread(target=self._refill, daemon=True).start()
+
+    def _refill(self):
+        while True:
+            time.sleep(self._interval)
+            try:
+                self._tokens.release()
+            except ValueError:
+                pass  # bucket is already full
+
+    def acquire(self):
+        self._tokens.acquire()
+
+RATE_LIMITER = RateLimiter(RATE_LIMIT)
+
 def last_week():
     today = datetime.date.today()
     end   = today 
     start = today - datetime.timedelta(days=7)
     return start.isoformat(), end.isoformat()
 
+# GetCostAndUsage bodies are captured raw and decoded with orjson instead of
+# botocore's per-element shape parser
+RAW_BODY_EVENT = "before-parse.cost-explorer.GetCostAndUsage"
+
+def _capture_raw_body(response_dict, customized_response_dict, **kwargs):
+    """Swap a successful response body for an empty document and keep the raw bytes"""
+    if response_dict["status_code"] == 200:
+        customized_response_dict["RawBody"] = response_dict["body"]
+        response_dict["body"] = b"{}"
+
+def with_raw_body(client):
+    client.meta.events.register(RAW_BODY_EVENT, _capture_raw_body)
+    return client
+
+def parse_raw(resp):
+    """Decode a captured body, keeping botocore's ResponseMetadata"""
+    data = orjson.loads(resp.pop("RawBody"))
+    data["ResponseMetadata"] = resp["ResponseMetadata"]
+    return data
+
 def ce_client():
-    return boto3.Session(profile_name=PROFILE).client("ce")
+    return with_raw_body(boto3.Session(profile_name=PROFILE).client("ce"))
 
 def fetch(client, start, end, groups):
     """
@@ -54,12 +135,25 @@ def fetch(client, start, end, groups):
     
     try:
         logging.info(f"Fetching costs for {[g['Key'] for g in groups]}")
-        return client.get_cost_and_usage(
-            TimePeriod={"Start": start, "End": end},
-            Granularity="MONTHLY",
-            Metrics=["AmortizedCost"],
-            GroupBy=groups
-        )
+        params = {
+            "TimePeriod": {"Start": start, "End": end},
+            "Granularity": "MONTHLY",
+            "Metrics": ["AmortizedCost"],
+            "GroupBy": groups
+        }
+        RATE_LIMITER.acquire()
+        data = parse_raw(client.get_cost_and_usage(**params))
+
+        # Multi-dimension groupings can be paged – merge every page's groups
+        # into its period so nothing derived from them is under-reported
+        token = data.pop("NextPageToken", None)
+        while token:
+            RATE_LIMITER.acquire()
+            page = parse_raw(client.get_cost_and_usage(**params, NextPageToken=token))
+            for period, more in zip(data["ResultsByTime"], page["ResultsByTime"]):
+                period["Groups"].extend(more.get("Groups", []))
+            token = page.get("NextPageToken")
+        return data
     except Exception as e:
         logging.error(f"Error fetching costs: {str(e)}")
         # Return empty result structure
@@ -76,31 +170,62 @@ def resp_to_df(resp):
     Convert API response to DataFrame.
     Handles both single and multi-dimension groupings.
     """
-    groups = resp["ResultsByTime"][0]["Groups"]
+    return groups_to_df(resp["ResultsByTime"][0]["Groups"])
+
+def groups_to_df(groups):
+    """Convert the Groups of one ResultsByTime period to a DataFrame"""
     if not groups:
         return pd.DataFrame({"Key": [], "Cost": []})
-    
-    # For multi-dimension grouping, keys will be a list of values
-    multi_dim = len(groups[0]["Keys"]) > 1 if groups else False
-    
-    if multi_dim:
-        # For multi-dimension, we'll create columns for each dimension
-        data = []
-        for g in groups:
-            item = {f"Dim{i+1}": val for i, val in enumerate(g["Keys"])}
-            item["Cost"] = float(g["Metrics"]["AmortizedCost"]["Amount"])
-            data.append(item)
-        return pd.DataFrame(data).sort_values("Cost", ascending=False)
+
+    # Single pass into preallocated arrays; numpy parses the Amount strings itself
+    n = len(groups)
+    keys = np.empty((n, len(groups[0]["Keys"])), dtype=object)
+    costs = np.empty(n, dtype=np.float64)
+    for i, g in enumerate(groups):
+        keys[i] = g["Keys"]
+        costs[i] = g["Metrics"]["AmortizedCost"]["Amount"]
+
+    # One "Key" column, or Dim1..DimN for multi-dimension groupings
+    if keys.shape[1] > 1:
+        columns = [f"Dim{i+1}" for i in range(keys.shape[1])]
     else:
-        # Single dimension (original behavior)
-        keys = [g["Keys"][0] for g in groups]
-        costs = [float(g["Metrics"]["AmortizedCost"]["Amount"]) for g in groups]
-        return pd.DataFrame({"Key": keys, "Cost": costs}).sort_values("Cost", ascending=False)
+        columns = ["Key"]
+    # Dimension values repeat heavily, so store them as categoricals; Cost stays
+    # float64 because float32 can't hold cent precision on large totals
+    df = pd.DataFrame(keys, columns=columns).astype("category")
+    df["Cost"] = costs
+    return df.sort_values("Cost", ascending=False, kind="stable")
+
+
+def collapse(resp, index):
+    """
+    Derive a single-dimension response from a multi-dimension one by summing
+    over the other dimensions. Keeps the Cost Explorer response shape.
+    Amounts are summed as Decimals straight from the API strings, so they come
+    out as clean decimal strings like real Cost Explorer output.
+    """
+    results = []
+    for period in resp["ResultsByTime"]:
+        groups = []
+        if period["Groups"]:
+            unit = period["Groups"][0]["Metrics"]["AmortizedCost"]["Unit"]
+            costs = {}
+            for g in period["Groups"]:
+                key = g["Keys"][index]
+                costs[key] = costs.get(key, 0) + Decimal(g["Metrics"]["AmortizedCost"]["Amount"])
+            groups = [
+                {"Keys": [key], "Metrics": {"AmortizedCost": {"Amount": format(cost, "f"), "Unit": unit}}}
+                for key, cost in sorted(costs.items())
+            ]
+        results.append(dict(period, Groups=groups))
+    return {"ResultsByTime": results}
 
+@functools.lru_cache(maxsize=1)
 def get_billing_period(client):
     """
     Get the current AWS billing period (month).
     Returns a dict with start and end dates.
+    Only depends on today's date, so it's computed once per run.
     """
     try:
         today = datetime.date.today()
@@ -137,11 +262,12 @@ def get_billing_cycle_total(client, start_date=None, end_date=None):
             
         logging.info(f"Getting billing cycle total for {start_date} to {end_date}")
         
-        response = client.get_cost_and_usage(
+        RATE_LIMITER.acquire()
+        response = parse_raw(client.get_cost_and_usage(
             TimePeriod={"Start": start_date, "End": end_date},
             Granularity="MONTHLY",
             Metrics=["AmortizedCost"]
-        )
+        ))
         
         if not response["ResultsByTime"]:
             return {"total_cost": 0, "currency": "USD"}
@@ -154,76 +280,61 @@ def get_billing_cycle_total(client, start_date=None, end_date=None):
         logging.error(f"Error fetching billing cycle total: {str(e)}")
         return {"total_cost": 0, "currency": "USD"}
 
+def save_raw(key, resp):
+    """Save a Cost Explorer response as raw_{key}.json"""
+    json_path = os.path.join(OUT_DIR, f"raw_{key}.json")
+    with open(json_path, "wb") as f:
+        f.write(orjson.dumps(resp, option=orjson.OPT_INDENT_2))
+    print(f"💾  Saved JSON: {json_path}")
+
 # ───────── main ─────────
 def main():
     start, end = last_week()
     client = ce_client()
 
-    # 1. Single dimension queries
-    for g in DIMENSIONS:
-        key = g["Key"]
-        print(f"→ AWS grouping by {key} …")
-        resp = fetch(client, start, end, g)
+    # Single and multi-dimension queries, keyed by output file name
+    queries = {g["Key"]: g for g in DIMENSIONS}
+    queries.update(MULTI_DIMENSIONS)
+    queries.update(PAIRED_DIMENSIONS)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {}
+        for key, groups in queries.items():
+            print(f"→ AWS grouping by {key} …")
+            futures[executor.submit(fetch, client, start, end, groups)] = key
+
+        # Billing cycle total (similar to Azure)
+        print("\n→ Querying billing-cycle total cost …")
+        period = get_billing_period(client)
+        billing_future = executor.submit(get_billing_cycle_total, client,
+                                         start_date=period["start"] if period else None,
+                                         end_date=period["end"] if period else None)
 
-        # Save JSON data
-        json_path = os.path.join(OUT_DIR, f"raw_{key}.json")
-        with open(json_path, "w") as f:
-            json.dump(resp, f, indent=2)
-        print(f"💾  Saved JSON: {json_path}")
+        # Save JSON data as each query completes (paired queries stay in memory)
+        responses = {}
+        for future in as_completed(futures):
+            key = futures[future]
+            responses[key] = future.result()
+            if key not in PAIRED_DIMENSIONS:
+                save_raw(key, responses[key])
+
+        billing_total = billing_future.result()
+
+    # Single dimension views summed out of the multi-dimension responses
+    for key, (query, index) in DERIVED_DIMENSIONS.items():
+        print(f"→ AWS grouping by {key} (from {query}) …")
+        resp = collapse(responses[query], index)
+        save_raw(key, resp)
 
         df = resp_to_df(resp)
 
         # limit UsageType chart to top 20 cost buckets
-        if g["Key"] == "USAGE_TYPE":
+        if key == "USAGE_TYPE":
             df = df.head(20)
 
-        time.sleep(THROTTLE)
-    
-    # 2. Project by Region query (similar to Azure's project by region)
-    print("\n→ Querying Project tag by Region costs …")
-    time.sleep(LONG_THROTTLE)
-    
-    project_region_groups = [
-        {"Type": "TAG", "Key": "Project"},
-        {"Type": "DIMENSION", "Key": "REGION"}
-    ]
-    
-    resp = fetch(client, start, end, project_region_groups)
-    json_path = os.path.join(OUT_DIR, "raw_project_by_region.json")
-    with open(json_path, "w") as f:
-        json.dump(resp, f, indent=2)
-    print(f"💾  Saved JSON: {json_path}")
-    
-    # 3. Project by Resource query (using RESOURCE_ID dimension if available)
-    # Note: AWS Cost Explorer doesn't directly expose RESOURCE_ID as a dimension
-    # You can use a resource-id tag if you've set one up
-    print("\n→ Querying Project tag by Resource costs …")
-    time.sleep(LONG_THROTTLE)
-    
-    # First try with resource-id tag if you have one
-    project_resource_groups = [
-        {"Type": "TAG", "Key": "Project"},
-        {"Type": "DIMENSION", "Key": "USAGE_TYPE"}  # Change this to match your tagging strategy
-    ]
-    
-    resp = fetch(client, start, end, project_resource_groups)
-    json_path = os.path.join(OUT_DIR, "raw_project_by_resource.json")
-    with open(json_path, "w") as f:
-        json.dump(resp, f, indent=2)
-    print(f"💾  Saved JSON: {json_path}")
-    
-    # 4. Get billing cycle total (similar to Azure)
-    print("\n→ Querying billing-cycle total cost …")
-    time.sleep(LONG_THROTTLE)
-    
-    period = get_billing_period(client)
-    billing_total = get_billing_cycle_total(client, 
-                                         start_date=period["start"] if period else None,
-                                         end_date=period["end"] if period else None)
-    
     json_path = os.path.join(OUT_DIR, "billing_cycle_total.json")
-    with open(json_path, "w") as f:
-        json.dump(billing_total, f, indent=2)
+    with open(json_path, "wb") as f:
+        f.write(orjson.dumps(billing_total, option=orjson.OPT_INDENT_2))
     print(f"💾  Saved JSON: {json_path}")
     print(f"✅ Billing-cycle total so far: {billing_total['currency']} {billing_total['total_cost']:.2f}")
 
@@ -1,63 +1,80 @@
 import os
-import json
 import datetime
+import numpy as np
+import orjson
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
 
 # Get today's date format for the directory
 today = datetime.datetime.now().strftime("%d-%m-%Y")
 aws_dir = f"aws-cost-reports-{today}"
 
-if not os.path.exists(aws_dir):
-    print(f"Directory {aws_dir} not found!")
-    exit(1)
-
-print(f"Processing JSON files in {aws_dir}...")
-
-# Find all raw JSON files
-json_files = [f for f in os.listdir(aws_dir) if f.startswith("raw_") and f.endswith(".json")]
-print(f"Found {len(json_files)} JSON files")
-
-totals = {}
-
-# Process each file
-for filename in sorted(json_files):
-    filepath = os.path.join(aws_dir, filename)
-    with open(filepath) as f:
-        data = json.load(f)
-    
-    # Extract metric and grouping type from filename
-    metric_name = filename.split("_")[1]
-    
-    # Initialize total for this file
-    file_total = 0
-    
-    # Sum up all costs in this file
-    for time_result in data.get("ResultsByTime", []):
-        # Sum groups if they exist
-        groups = time_result.get("Groups", [])
+def _iter_costs(data):
+    """Yield every group Amount, or the period Total when a period has no groups"""
+    for time_result in data.get("ResultsByTime", ()):
+        groups = time_result.get("Groups")
         if groups:
             for group in groups:
-                cost = float(group["Metrics"]["AmortizedCost"]["Amount"])
-                file_total += cost
-        # If no groups, look for a Total field
+                yield float(group["Metrics"]["AmortizedCost"]["Amount"])
         elif "Total" in time_result:
-            cost = float(time_result["Total"]["AmortizedCost"]["Amount"])
-            file_total += cost
-    
-    totals[metric_name] = file_total
-    print(f"{metric_name:15s}: ${file_total:.2f}")
-
-# Calculate the grand total across all files
-grand_total = sum(totals.values())
-print("\nUnique totals found:")
-unique_totals = set(totals.values())
-for total in sorted(unique_totals):
-    print(f"${total:.2f}")
-
-print(f"\nSum of all file totals: ${grand_total:.2f}")
-
-# Check if we need to divide by the number of files to get the actual total
-if len(unique_totals) == 1:
-    print(f"All files show the same total: ${next(iter(unique_totals)):.2f}")
-    print("The discrepancy is likely between the AWS API data and the UI display.")
-else:
-    print("Files show different totals. The issue might be in how the data is grouped.")
\ No newline at end of file
+            yield float(time_result["Total"]["AmortizedCost"]["Amount"])
+
+def _process(path):
+    """Parse one raw JSON file and sum up all costs in it (runs in a worker process)"""
+    with open(path, "rb") as f:
+        data = orjson.loads(f.read())
+    return path, float(np.fromiter(_iter_costs(data), dtype=np.float64).sum())
+
+def main():
+    if not os.path.exists(aws_dir):
+        print(f"Directory {aws_dir} not found!")
+        exit(1)
+
+    print(f"Processing JSON files in {aws_dir}...")
+
+    totals_path = os.path.join(aws_dir, "totals.parquet")
+
+    if os.path.exists(totals_path):
+        # get_aws_costs.py already reduced every raw file to typed rows
+        print("Reading precomputed totals.parquet")
+        summed = pq.read_table(totals_path).group_by("grouping").aggregate([("cost", "sum")])
+        totals = dict(zip(summed["grouping"].to_pylist(), summed["cost_sum"].to_pylist()))
+        for metric_name in sorted(totals):
+            print(f"{metric_name:15s}: ${totals[metric_name]:.2f}")
+    else:
+        # Find all raw JSON files
+        json_files = [e.path for e in os.scandir(aws_dir)
+                      if e.is_file() and e.name.startswith("raw_") and e.name.endswith(".json")]
+        print(f"Found {len(json_files)} JSON files")
+
+        totals = {}
+
+        # Files are independent – parse and sum them in parallel, one per worker
+        with ProcessPoolExecutor() as ex:
+            for path, file_total in ex.map(_process, sorted(json_files)):
+                # raw_{key}_{start}_{end}.json -> key, the label totals.parquet uses
+                name = os.path.basename(path)[len("raw_"):-len(".json")]
+                metric_name = name.rsplit("_", 2)[0]
+
+                totals[metric_name] = file_total
+                print(f"{metric_name:15s}: ${file_total:.2f}")
+
+    # Calculate the grand total across all files
+    grand_total = sum(totals.values())
+    print("\nUnique totals found:")
+    # Compare to the cent so float noise doesn't count as a different total
+    unique_totals = {round(v, 2) for v in totals.values()}
+    for total in sorted(unique_totals):
+        print(f"${total:.2f}")
+
+    print(f"\nSum of all file totals: ${grand_total:.2f}")
+
+    # Check if we need to divide by the number of files to get the actual total
+    if len(unique_totals) == 1:
+        print(f"All files show the same total: ${next(iter(unique_totals)):.2f}")
+        print("The discrepancy is likely between the AWS API data and the UI display.")
+    else:
+        print("Files show different totals. The issue might be in how the data is grouped.")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,34 @@
 #!/usr/bin/env python3
-import os, json, datetime
+import os, io, datetime, functools, logging
+import orjson
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
-from matplotlib.backends.backend_pdf import PdfPages
+import pyarrow as pa, pyarrow.json as paj
+from pypdf import PdfWriter
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Flowable
+
+STYLES = getSampleStyleSheet()
+
+log = logging.getLogger(__name__)
+
+# Substrings that mark a cost column in the AWS raw files, tried in order
+_COST_TERMS = ("cost", "amount", "amortizedcost")
+
+# AWS tables: raw_{key} file, label column name, title, rows kept (None = all)
+AWS_TABLES = [
+    ("SERVICE", "Service", "AWS Cost by Service",      30),
+    ("Project", "Project", "AWS Cost by Tag: Project", None),
+]
+
+# Flattened Key/Cost sidecar that get_aws_costs.py writes next to each raw file
+AWS_NDJSON_OPTIONS = paj.ParseOptions(explicit_schema=pa.schema([
+    ("Key",  pa.string()),
+    ("Cost", pa.float64()),
+]))
 
 # ───────── helpers ─────────
 def today_stamp():
@@ -15,30 +40,139 @@ def last_week():
     start = today - datetime.timedelta(days=7)
     return start.isoformat(), end.isoformat()
 
+@functools.lru_cache(maxsize=16)
+def _read_cost_json(path, mtime):
+    """Decoded CostManagement file; mtime is part of the key so rewrites are re-read"""
+    with open(path, "rb") as f:
+        props = orjson.loads(f.read())["properties"]
+    cols = [c["name"] for c in props["columns"]]
+    return pd.DataFrame.from_records(props["rows"], columns=cols, coerce_float=True)
+
 def load_df(path):
-    with open(path) as f:
-        d = json.load(f)
-    cols = [c["name"] for c in d["properties"]["columns"]]
-    rows = d["properties"]["rows"]
-    return pd.DataFrame(rows, columns=cols)
-
-def add_table(pdf, title, df, highlight_total=False, col_widths=None):
-    fig, ax = plt.subplots(figsize=(8,11))
-    ax.axis('off')
-    ax.set_title(title, pad=20)
-    tbl = ax.table(cellText=df.values,
-                   colLabels=df.columns,
-                   loc='center',
-                   colWidths=col_widths)
-    tbl.auto_set_font_size(False)
-    tbl.set_fontsize(10)
-    tbl.scale(1,1.5)
+    # hand out a copy so callers can't modify the cached frame
+    return _read_cost_json(path, os.path.getmtime(path)).copy()
+
+def append_total(df, total_row):
+    """Return df with total_row (one value per column) appended as its last row"""
+    return pd.concat([df, pd.DataFrame([total_row], columns=df.columns)], ignore_index=True)
+
+def add_table(story, doc, title, df, highlight_total=False, col_widths=None):
+    """Append a titled ReportLab table page (col_widths are fractions of the frame)"""
+    widths = [w * doc.width for w in col_widths] if col_widths else None
+    tbl = Table([df.columns.tolist()] + df.values.tolist(), colWidths=widths, repeatRows=1)
+    style = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+    ]
     if highlight_total:
-        for i in range(len(df.columns)):
-            cell = tbl[len(df)-1, i]
-            cell.set_facecolor("lightgray")
-            cell.set_text_props(weight='bold')
-    pdf.savefig(fig); plt.close(fig)
+        style += [
+            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold')
+        ]
+    tbl.setStyle(TableStyle(style))
+    story += [Paragraph(title, STYLES["Heading2"]), Spacer(1, 12), tbl, PageBreak()]
+
+class ChartPage(Flowable):
+    """Full-frame chart: the PNG bytes go straight to canvas.drawImage, no re-render"""
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def wrap(self, avail_w, avail_h):
+        self.width, self.height = avail_w, avail_h
+        return avail_w, avail_h
+
+    def draw(self):
+        self.canv.drawImage(ImageReader(self.path), 0, 0, width=self.width, height=self.height,
+                            preserveAspectRatio=True, anchor='n')
+
+class CoverPage(Flowable):
+    """Title page drawn as two centred strings straight on the canvas"""
+    def __init__(self, start, end):
+        super().__init__()
+        self.start, self.end = start, end
+
+    def wrap(self, avail_w, avail_h):
+        self.width, self.height = avail_w, avail_h
+        return avail_w, avail_h
+
+    def draw(self):
+        c = self.canv
+        c.setFont("Helvetica", 24)
+        c.drawCentredString(self.width / 2, self.height * 0.6, "Weekly Cloud Cost Report")
+        c.setFont("Helvetica", 16)
+        c.drawCentredString(self.width / 2, self.height * 0.4, f"{self.start} to {self.end}")
+
+def add_chart(story, path):
+    """Append a chart PNG as its own page"""
+    story.append(ChartPage(path))
+
+def render_pages(story, writer):
+    """Lay the pending story out with ReportLab and append its pages to writer"""
+    if story and isinstance(story[-1], PageBreak):
+        story.pop()  # don't end the section on a blank page
+    if story:
+        buf = io.BytesIO()
+        SimpleDocTemplate(buf, pagesize=letter).build(story)
+        writer.append(buf)
+        story.clear()
+
+def pick_col(df, *terms):
+    """First column whose lower-cased name contains one of terms (tried in order), or None"""
+    low = df.columns.astype(str).str.lower()
+    for t in terms:
+        m = low.str.contains(t, regex=False)
+        if m.any():
+            return df.columns[m][0]
+    return None
+
+def emit_aws_table(story, doc, df, label, title, top_n=None):
+    """Add a Cost / label / Currency table with a TOTAL row, detecting the source columns"""
+    what = label.lower()
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("✓ Loaded %s data with columns: %s", what, df.columns.tolist())
+
+    # Try to identify cost column
+    cost_col = pick_col(df, *_COST_TERMS)
+    if cost_col is None:
+        log.warning("❌ Could not identify cost column in %s data", what)
+        cost_col = df.columns[1] if len(df.columns) >= 2 else df.columns[0]
+    log.debug("📊 Using '%s' as cost column", cost_col)
+
+    # Identify label column ('Key' is the format from get_aws_costs.py)
+    if 'Key' in df.columns:
+        label_col = 'Key'
+    else:
+        low = df.columns.astype(str).str.lower()
+        other = (df.columns != cost_col) & ~low.str.contains('cost') & ~low.str.contains('currency')
+        label_col = df.columns[other][0] if other.any() else df.columns[0]
+    log.debug("📊 Using '%s' column for %s names", label_col, what)
+
+    try:
+        # Convert cost to numeric and round
+        df = df.rename(columns={cost_col: 'Cost'})
+        df['Cost'] = pd.to_numeric(df['Cost'], errors='coerce').fillna(0).round(2)
+
+        # Keep the top rows by cost
+        if top_n:
+            df = df.nlargest(top_n, 'Cost')
+
+        total = df['Cost'].sum().round(2)
+        df_display = pd.DataFrame({
+            'Cost': df['Cost'].values,
+            label: df[label_col].fillna('Untagged').values if label_col in df.columns else 'Unknown',
+            'Currency': df['Currency'].values if 'Currency' in df.columns else 'USD'
+        })
+        df_display = append_total(df_display, [total, 'TOTAL', df_display['Currency'].iloc[0]])
+
+        log.info("✓ Created %s table with %d rows plus total", what, len(df_display) - 1)
+        add_table(story, doc, title, df_display, highlight_total=True,
+                  col_widths=[0.2, 0.6, 0.2])
+    except Exception as e:
+        log.error("❌ Error creating %s table: %s", what, e)
 
 # ───────── main report ─────────
 def build_report():
@@ -48,271 +182,155 @@ def build_report():
     start, end   = last_week()
     pdf_path     = f"cloud-cost-report_{start}_{end}.pdf"
 
-    with PdfPages(pdf_path) as pdf:
-        # Cover
-        fig = plt.figure(figsize=(8,11))
-        plt.text(0.5,0.6,"Weekly Cloud Cost Report",ha="center",va="center",size=24)
-        plt.text(0.5,0.4,f"{start} to {end}",ha="center",va="center",size=16)
-        plt.axis('off'); pdf.savefig(fig); plt.close(fig)
+    # ReportLab sections are laid out one at a time and merged with the chart
+    # PDFs; doc only supplies the page geometry they share
+    doc    = SimpleDocTemplate(io.BytesIO(), pagesize=letter)
+    writer = PdfWriter()
 
-        # Utility: iterate Azure then AWS
-        for cloud, folder in [("Azure", azure_dir), ("AWS", aws_dir)]:
-            if not os.path.isdir(folder):
-                continue
-            # charts
-            pngs = [os.path.join(folder,f) for f in os.listdir(folder)
-                    if f.endswith(".png") and start in f and end in f]
-            pngs.sort()
-            for p in pngs:
-                img = mpimg.imread(p)
-                fig = plt.figure(figsize=(8,11))
-                plt.imshow(img); plt.axis('off')
-                pdf.savefig(fig); plt.close(fig)
-
-            # tables
-            if cloud == "Azure":
-                # Resource Group table
-                json_path = os.path.join(folder,
-                            f"raw_ResourceGroupName_{start}_{end}.json")
-                if os.path.exists(json_path):
-                    df = load_df(json_path)
-                    df = df.rename(columns={c:'Cost' for c in df.columns if 'cost' in c.lower()})
-                    df['Cost'] = df['Cost'].round(2)
-                    total = df['Cost'].sum().round(2)
-                    df_display = df[['Cost','ResourceGroupName','Currency']]
-                    df_display.loc[len(df_display)] = [total,'TOTAL',df_display['Currency'].iloc[0]]
-                    add_table(pdf,"Azure Cost by Resource Group",df_display,highlight_total=True,
-                              col_widths=[0.2,0.6,0.2])
-                
-                # Project tag table
-                project_json = os.path.join(folder,
-                              f"raw_project_{start}_{end}.json")
-                if os.path.exists(project_json):
-                    # FIXED: Use project_json not json_path
-                    df = load_df(project_json)
-                    df = df.rename(columns={c:'Cost' for c in df.columns if 'cost' in c.lower()})
-                    
-                    # For TagKey/TagValue format
-                    if 'TagKey' in df.columns and 'TagValue' in df.columns:
-                        df['TagValue'] = df['TagValue'].fillna('Untagged')
-                        df_display = df[['Cost','TagValue','Currency']]
-                        df_display = df_display.rename(columns={'TagValue':'Project'})
-                    else:
-                        # Check for project column with various possible names
-                        project_col = None
-                        for col in ['project', 'Project', 'PROJECT']:
-                            if col in df.columns:
-                                project_col = col
-                                break
-                                
-                        if project_col:
-                            df_display = df[['Cost', project_col, 'Currency']]
-                            df_display = df_display.rename(columns={project_col: 'Project'})
-                        else:
-                            # If no project column found, use any column that's not Cost or Currency
-                            non_cost_cols = [c for c in df.columns if c != 'Cost' and c != 'Currency']
-                            if non_cost_cols:
-                                df_display = df[['Cost', non_cost_cols[0], 'Currency']]
-                                df_display = df_display.rename(columns={non_cost_cols[0]: 'Project'})
-                            else:
-                                print(f"⚠️ No suitable project column found in {project_json}")
-                                continue
-                    
-                    df_display['Cost'] = df_display['Cost'].round(2)
-                    total = df_display['Cost'].sum().round(2)
-                    df_display.loc[len(df_display)] = [total,'TOTAL',df_display['Currency'].iloc[0]]
-                    add_table(pdf,"Azure Cost by Tag: Project",df_display,highlight_total=True,
-                              col_widths=[0.2,0.6,0.2])
-
-            if cloud == "AWS":
-                print(f"\n🔍 Looking for AWS data in {folder}")
-                
-                # First check if AWS directory exists and has files
-                if not os.path.isdir(folder):
-                    print(f"⚠️ AWS directory {folder} does not exist")
-                    continue
-                
-                aws_files = os.listdir(folder)
-                print(f"📁 AWS files found: {aws_files}")
+    # Cover
+    story = [CoverPage(start, end)]
+
+    # Utility: iterate Azure then AWS
+    for cloud, folder in [("Azure", azure_dir), ("AWS", aws_dir)]:
+        if not os.path.isdir(folder):
+            continue
+        # charts: vector PDFs are merged in as they are; PNGs only for
+        # folders written before the fetch scripts saved PDFs
+        with os.scandir(folder) as it:
+            week = [e for e in it if e.is_file() and start in e.name and end in e.name]
+        charts = sorted(e.path for e in week if e.name.endswith(".pdf"))
+        if charts:
+            render_pages(story, writer)
+            for p in charts:
+                writer.append(p)
+        else:
+            for p in sorted(e.path for e in week if e.name.endswith(".png")):
+                add_chart(story, p)
+
+        # tables
+        if cloud == "Azure":
+            # Resource Group table
+            json_path = os.path.join(folder,
+                        f"raw_ResourceGroupName_{start}_{end}.json")
+            if os.path.exists(json_path):
+                df = load_df(json_path)
+                df = df.rename(columns={c:'Cost' for c in df.columns if 'cost' in c.lower()})
+                df['Cost'] = df['Cost'].round(2)
+                total = df['Cost'].sum().round(2)
+                df_display = df[['Cost','ResourceGroupName','Currency']]
+                df_display = append_total(df_display, [total,'TOTAL',df_display['Currency'].iloc[0]])
+                add_table(story, doc,"Azure Cost by Resource Group",df_display,highlight_total=True,
+                          col_widths=[0.2,0.6,0.2])
+            
+            # Project tag table
+            project_json = os.path.join(folder,
+                          f"raw_project_{start}_{end}.json")
+            if os.path.exists(project_json):
+                # FIXED: Use project_json not json_path
+                df = load_df(project_json)
+                df = df.rename(columns={c:'Cost' for c in df.columns if 'cost' in c.lower()})
                 
-                # Function to load AWS data with fallback methods
-                def load_aws_data(filepath):
-                    print(f"📊 Attempting to load AWS data from {filepath}")
-                    try:
-                        # First try: Check if data is in format from get_aws_costs.py
-                        with open(filepath) as f:
-                            data = json.load(f)
-                            
-                        # Special handling for AWS Cost Explorer data format
-                        if "ResultsByTime" in data:
-                            print("✓ Detected AWS Cost Explorer format")
-                            
-                            result_data = []
-                            for time_period in data["ResultsByTime"]:
-                                for group in time_period.get("Groups", []):
-                                    key = group["Keys"][0]
-                                    cost = float(group["Metrics"]["AmortizedCost"]["Amount"])
-                                    result_data.append({"Key": key, "Cost": cost})
-                            
-                            return pd.DataFrame(result_data)
-                        # For other formats, try standard load
-                        else:
-                            print("⚠️ Not in AWS Cost Explorer format, trying standard load...")
-                            return load_df(filepath)
-                    except Exception as e:
-                        print(f"⚠️ Error loading AWS data: {e}")
-                        # Last resort: try to load it directly
-                        try:
-                            return pd.read_json(filepath)
-                        except Exception as nested_e:
-                            print(f"❌ All loading methods failed: {nested_e}")
-                            return None
-
-                # Table 1 – by Service
-                # Look for service data with case-insensitive matching
-                service_json = os.path.join(folder, f"raw_SERVICE_{start}_{end}.json")
-                print(f"🔍 Looking for AWS Service file: {service_json}")
-                if os.path.exists(service_json):
-                    print(f"✓ Found AWS Service file")
-                    df = load_aws_data(service_json)
-                    if df is not None and not df.empty:
-                        print(f"✓ Loaded service data with columns: {df.columns.tolist()}")
-                        
-                        # Try to identify cost column
-                        cost_cols = [c for c in df.columns if any(term in c.lower() for term in ['cost', 'amount', 'amortizedcost'])]
-                        if cost_cols:
-                            cost_col = cost_cols[0]
-                        elif 'Key' in df.columns and len(df.columns) >= 2:  # Handle format from resp_to_df
-                            # The AWS get_aws_costs.py script creates a simple Key/Cost DataFrame
-                            cost_col = 'Cost'
-                        elif len(df.columns) >= 2:  # Assume second column if at least 2 columns
-                            cost_col = df.columns[1]
-                        else:
-                            print("❌ Could not identify cost column in service data")
-                            cost_col = df.columns[0]  # Just use first column as fallback
+                # For TagKey/TagValue format
+                if 'TagKey' in df.columns and 'TagValue' in df.columns:
+                    df['TagValue'] = df['TagValue'].fillna('Untagged')
+                    df_display = df[['Cost','TagValue','Currency']]
+                    df_display = df_display.rename(columns={'TagValue':'Project'})
+                else:
+                    # Check for project column with various possible names
+                    project_col = None
+                    for col in ['project', 'Project', 'PROJECT']:
+                        if col in df.columns:
+                            project_col = col
+                            break
                             
-                        print(f"📊 Using '{cost_col}' as cost column")
-                        
-                        # Identify service column
-                        if 'Key' in df.columns:  # Handle format from resp_to_df
-                            service_col = 'Key'
-                            print(f"📊 Using 'Key' column for service names")
+                    if project_col:
+                        df_display = df[['Cost', project_col, 'Currency']]
+                        df_display = df_display.rename(columns={project_col: 'Project'})
+                    else:
+                        # If no project column found, use any column that's not Cost or Currency
+                        non_cost_cols = [c for c in df.columns if c != 'Cost' and c != 'Currency']
+                        if non_cost_cols:
+                            df_display = df[['Cost', non_cost_cols[0], 'Currency']]
+                            df_display = df_display.rename(columns={non_cost_cols[0]: 'Project'})
                         else:
-                            non_cost_cols = [c for c in df.columns if c != cost_col and not any(term in c.lower() for term in ['cost', 'currency'])]
-                            if non_cost_cols:
-                                service_col = non_cost_cols[0]
-                                print(f"📊 Using '{service_col}' as service column")
-                            else:
-                                print("❌ Could not identify service column")
-                                service_col = df.columns[0]  # Fallback to first column
-                        
-                        # Proceed with table creation
-                        try:
-                            # Convert cost to numeric and round
-                            df = df.rename(columns={cost_col: 'Cost'})
-                            df['Cost'] = pd.to_numeric(df['Cost'], errors='coerce').fillna(0).round(2)
-                            
-                            # Sort and take top services
-                            df = df.sort_values(by='Cost', ascending=False).head(30)
-                            
-                            # Calculate total
-                            total = df['Cost'].sum().round(2)
-                            
-                            # Ensure Currency column exists
-                            if 'Currency' not in df.columns:
-                                df['Currency'] = 'USD'
-                            
-                            # Create display dataframe
-                            df_display = pd.DataFrame()
-                            df_display['Cost'] = df['Cost']
-                            df_display['Service'] = df[service_col] if service_col in df.columns else 'Unknown'
-                            df_display['Currency'] = df['Currency'] if 'Currency' in df.columns else 'USD'
-                            
-                            # Add total row
-                            df_display.loc[len(df_display)] = [total, 'TOTAL', df_display['Currency'].iloc[0]]
-                            
-                            print(f"✓ Created service table with {len(df_display)-1} rows plus total")
-                            add_table(pdf, "AWS Cost by Service", df_display, highlight_total=True,
-                                    col_widths=[0.2, 0.6, 0.2])
-                        except Exception as e:
-                            print(f"❌ Error creating service table: {str(e)}")
-                else:
-                    print(f"❌ AWS Service file not found: {service_json}")
+                            print(f"⚠️ No suitable project column found in {project_json}")
+                            continue
                 
-                # Table 2 – by Project tag
-                # Look for project data with case-insensitive matching
-                project_json = os.path.join(folder, f"raw_Project_{start}_{end}.json")
-                print(f"🔍 Looking for AWS Project file: {project_json}")
-                if os.path.exists(project_json):
-                    print(f"✓ Found AWS Project file")
-                    df = load_aws_data(project_json)
-                    if df is not None and not df.empty:
-                        print(f"✓ Loaded project data with columns: {df.columns.tolist()}")
-                        
-                        # Try to identify cost column
-                        cost_cols = [c for c in df.columns if any(term in c.lower() for term in ['cost', 'amount', 'amortizedcost'])]
-                        if cost_cols:
-                            cost_col = cost_cols[0]
-                        elif 'Key' in df.columns and len(df.columns) >= 2:  # Handle format from resp_to_df
-                            # The AWS get_aws_costs.py script creates a simple Key/Cost DataFrame
-                            cost_col = 'Cost'
-                        elif len(df.columns) >= 2:  # Assume second column if at least 2 columns
-                            cost_col = df.columns[1]
-                        else:
-                            print("❌ Could not identify cost column in project data")
-                            cost_col = df.columns[0]  # Just use first column as fallback
-                            
-                        print(f"📊 Using '{cost_col}' as cost column")
+                df_display['Cost'] = df_display['Cost'].round(2)
+                total = df_display['Cost'].sum().round(2)
+                df_display = append_total(df_display, [total,'TOTAL',df_display['Currency'].iloc[0]])
+                add_table(story, doc,"Azure Cost by Tag: Project",df_display,highlight_total=True,
+                          col_widths=[0.2,0.6,0.2])
+
+        if cloud == "AWS":
+            log.debug("🔍 Looking for AWS data in %s", folder)
+            
+            # First check if AWS directory exists and has files
+            if not os.path.isdir(folder):
+                log.warning("⚠️ AWS directory %s does not exist", folder)
+                continue
+            
+            if log.isEnabledFor(logging.DEBUG):
+                with os.scandir(folder) as it:
+                    log.debug("📁 AWS files found: %s", ", ".join(e.name for e in it))
+            
+            # Function to load AWS data with fallback methods
+            def load_aws_data(filepath):
+                log.debug("📊 Attempting to load AWS data from %s", filepath)
+                try:
+                    # Fastest: the pre-flattened NDJSON sidecar, parsed by pyarrow
+                    sidecar = os.path.splitext(filepath)[0] + ".ndjson"
+                    if os.path.exists(sidecar) and os.path.getsize(sidecar):
+                        log.debug("✓ Reading flattened NDJSON sidecar")
+                        return paj.read_json(sidecar, parse_options=AWS_NDJSON_OPTIONS).to_pandas()
+
+                    # First try: Check if data is in format from get_aws_costs.py
+                    with open(filepath, "rb") as f:
+                        data = orjson.loads(f.read())
                         
-                        # Identify project column
-                        if 'Key' in df.columns:  # Handle format from resp_to_df
-                            project_col = 'Key'
-                            print(f"📊 Using 'Key' column for project names")
-                        else:
-                            non_cost_cols = [c for c in df.columns if c != cost_col and not any(term in c.lower() for term in ['cost', 'currency'])]
-                            if non_cost_cols:
-                                project_col = non_cost_cols[0]
-                                print(f"📊 Using '{project_col}' as project column")
-                            else:
-                                print("❌ Could not identify project column")
-                                project_col = df.columns[0]  # Fallback to first column
+                    # Special handling for AWS Cost Explorer data format
+                    if "ResultsByTime" in data:
+                        log.debug("✓ Detected AWS Cost Explorer format")
                         
-                        # Proceed with table creation
-                        try:
-                            # Convert cost to numeric and round
-                            df = df.rename(columns={cost_col: 'Cost'})
-                            df['Cost'] = pd.to_numeric(df['Cost'], errors='coerce').fillna(0).round(2)
-                            
-                            # Handle nulls
-                            df[project_col] = df[project_col].fillna('Untagged')
-                            
-                            # Ensure Currency column exists
-                            if 'Currency' not in df.columns:
-                                df['Currency'] = 'USD'
-                            
-                            # Calculate total
-                            total = df['Cost'].sum().round(2)
-                            
-                            # Create display dataframe
-                            df_display = pd.DataFrame()
-                            df_display['Cost'] = df['Cost']
-                            df_display['Project'] = df[project_col] if project_col in df.columns else 'Unknown'
-                            df_display['Currency'] = df['Currency'] if 'Currency' in df.columns else 'USD'
-                            
-                            # Add total row
-                            df_display.loc[len(df_display)] = [total, 'TOTAL', df_display['Currency'].iloc[0]]
-                            
-                            print(f"✓ Created project table with {len(df_display)-1} rows plus total")
-                            add_table(pdf, "AWS Cost by Tag: Project", df_display, highlight_total=True,
-                                    col_widths=[0.2, 0.6, 0.2])
-                        except Exception as e:
-                            print(f"❌ Error creating project table: {str(e)}")
-                else:
-                    print(f"❌ AWS Project file not found: {project_json}")
+                        groups = [g for period in data["ResultsByTime"]
+                                  for g in period.get("Groups", [])]
+                        return pd.DataFrame({
+                            "Key":  [g["Keys"][0] for g in groups],
+                            "Cost": np.fromiter((float(g["Metrics"]["AmortizedCost"]["Amount"]) for g in groups),
+                                                dtype=np.float64, count=len(groups))
+                        })
+                    # For other formats, try standard load
+                    else:
+                        log.warning("⚠️ Not in AWS Cost Explorer format, trying standard load...")
+                        return load_df(filepath)
+                except Exception as e:
+                    log.warning("⚠️ Error loading AWS data: %s", e)
+                    # Last resort: try to load it directly
+                    try:
+                        return pd.read_json(filepath)
+                    except Exception as nested_e:
+                        log.error("❌ All loading methods failed: %s", nested_e)
+                        return None
+
+            # Table 1 – by Service, Table 2 – by Project tag
+            for key, label, title, top_n in AWS_TABLES:
+                json_path = os.path.join(folder, f"raw_{key}_{start}_{end}.json")
+                log.debug("🔍 Looking for AWS %s file: %s", label, json_path)
+                if not os.path.exists(json_path):
+                    log.warning("❌ AWS %s file not found: %s", label, json_path)
+                    continue
+                log.debug("✓ Found AWS %s file", label)
+                df = load_aws_data(json_path)
+                if df is not None and not df.empty:
+                    emit_aws_table(story, doc, df, label, title, top_n)
 
+    render_pages(story, writer)
+    with open(pdf_path, "wb") as f:
+        writer.write(f)
     print(f"✅ PDF created: {pdf_path}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     build_report()
 
 
@@ -2,10 +2,17 @@
 """
 get_aws_costs.py  –  pull last week's AWS spend, grouped by
                     SERVICE, LINKED_ACCOUNT, USAGE_TYPE, and TAG:project.
-                    Writes one JSON + one PNG per grouping.
+                    Writes one JSON + one PNG per grouping, plus a
+                    typed totals.parquet of every group's cost.
 """
-import os, json, time, datetime
-import boto3, pandas as pd, matplotlib.pyplot as plt
+import os, time, datetime, threading, contextlib
+import boto3, orjson, numpy as np, pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # headless: charts are only ever written to files
+import matplotlib.pyplot as plt
+from matplotlib import font_manager
+import pyarrow as pa, pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
 
 # ───────── CONFIG ─────────
 PROFILE  = "cost-report"                           # your aws configure profile
@@ -21,9 +28,46 @@ DIMENSIONS = [
     {"Type": "TAG",       "Key": "Project"},   # <── new tag-based breakdown
 ]
 
-THROTTLE = 1  # seconds between calls (Cost Explorer limit is 5 req/s)
+# one row per group (or per ungrouped period Total) in totals.parquet
+TOTALS_SCHEMA = pa.schema([
+    ("grouping", pa.string()),
+    ("key",      pa.string()),
+    ("cost",     pa.float64()),
+    ("currency", pa.string()),
+])
+
+# Charts are sized for the report page (8.5" wide letter) and rastered at a fixed DPI
+CHART_SIZE = (8, 5.3)  # inches
+CHART_DPI  = 100
+
+# Throttling settings
+RATE_LIMIT  = 5  # Cost Explorer limit is 5 req/s
+MAX_WORKERS = 4  # concurrent Cost Explorer calls
 
 # ───────── helpers ─────────
+class RateLimiter:
+    """
+    Token bucket shared by all worker threads.
+    Holds up to `rate` tokens and refills one every 1/rate seconds.
+    """
+    def __init__(self, rate):
+        self._tokens = threading.BoundedSemaphore(rate)
+        self._interval = 1.0 / rate
+        threading.Thread(target=self._refill, daemon=True).start()
+
+    def _refill(self):
+        while True:
+            time.sleep(self._interval)
+            try:
+                self._tokens.release()
+            except ValueError:
+                pass  # bucket is already full
+
+    def acquire(self):
+        self._tokens.acquire()
+
+RATE_LIMITER = RateLimiter(RATE_LIMIT)
+
 def last_week():
     today = datetime.date.today()
     end   = today 
@@ -34,6 +78,8 @@ def ce_client():
     return boto3.Session(profile_name=PROFILE).client("ce")
 
 def fetch(client, start, end, group):
+    # boto3 clients are thread-safe, so the workers share one
+    RATE_LIMITER.acquire()
     return client.get_cost_and_usage(
         TimePeriod={"Start": start, "End": end},
         Granularity="MONTHLY",
@@ -44,48 +90,98 @@ def fetch(client, start, end, group):
 def resp_to_df(resp):
     groups = resp["ResultsByTime"][0]["Groups"]
     keys   = [g["Keys"][0] for g in groups]
-    costs  = [float(g["Metrics"]["AmortizedCost"]["Amount"]) for g in groups]
+    costs  = np.fromiter((float(g["Metrics"]["AmortizedCost"]["Amount"]) for g in groups),
+                         dtype=np.float64, count=len(groups))
     return pd.DataFrame({"Key": keys, "Cost": costs}).sort_values("Cost", ascending=False)
 
+def totals_table(grouping, resp):
+    rows = []
+    for period in resp["ResultsByTime"]:
+        if period.get("Groups"):
+            rows += [(g["Keys"][0], g["Metrics"]["AmortizedCost"])
+                     for g in period["Groups"]]
+        elif "Total" in period:
+            rows.append(("Total", period["Total"]["AmortizedCost"]))
+    return pa.table({
+        "grouping": [grouping] * len(rows),
+        "key":      [k for k, _ in rows],
+        "cost":     [float(m["Amount"]) for _, m in rows],
+        "currency": [m["Unit"] for _, m in rows],
+    }, schema=TOTALS_SCHEMA)
+
+# Warm the font cache once so the first chart draw doesn't pay for the lookup
+font_manager.findfont(font_manager.FontProperties(family=plt.rcParams["font.family"]))
+
+# one figure for every chart, cleared between uses (charts are drawn on the main thread)
+_CHART_FIG = plt.figure(figsize=CHART_SIZE)
+
+def write_ndjson(path, resp):
+    """One {"Key", "Cost"} line per group, over every period, for the report's pyarrow reader"""
+    with open(path, "wb") as f:
+        for period in resp["ResultsByTime"]:
+            for g in period.get("Groups", []):
+                f.write(orjson.dumps({"Key":  g["Keys"][0],
+                                      "Cost": float(g["Metrics"]["AmortizedCost"]["Amount"])}))
+                f.write(b"\n")
+
 def make_chart(df, title, path):
-    plt.figure(figsize=(12,8))
+    _CHART_FIG.clf()
+    ax = _CHART_FIG.add_subplot(111)
     x = range(len(df))
-    plt.bar(x, df["Cost"])
-    plt.xticks(x, df["Key"], rotation=45, ha="right")
-    plt.title(title, fontsize=18)
-    plt.ylabel("USD")
-    plt.tight_layout(pad=2.0)
-    plt.savefig(path, bbox_inches="tight")
-    plt.close()
+    ax.bar(x, df["Cost"])
+    ax.set_xticks(x, df["Key"], rotation=45, ha="right")
+    ax.set_title(title, fontsize=18)
+    ax.set_ylabel("USD")
+    _CHART_FIG.tight_layout(pad=2.0)
+    _CHART_FIG.savefig(path, dpi=CHART_DPI, bbox_inches="tight")
+    # vector copy that generate_pdf_report.py merges into the report as-is
+    _CHART_FIG.savefig(os.path.splitext(path)[0] + ".pdf", bbox_inches="tight")
 
 # ───────── main ─────────
 def main():
     start, end = last_week()
     client = ce_client()
 
-    for g in DIMENSIONS:
-        key = g["Key"]
-        print(f"→ AWS grouping by {key} …")
-        resp = fetch(client, start, end, g)
-
-        # Save JSON data
-        json_path = os.path.join(OUT_DIR, f"raw_{key}_{start}_{end}.json")
-        with open(json_path, "w") as f:
-            json.dump(resp, f, indent=2)
-        print(f"💾  Saved JSON: {json_path}")
-
-        df = resp_to_df(resp)
-
-        # limit UsageType chart to top 20 cost buckets
-        if g["Key"] == "USAGE_TYPE":
-            df = df.head(20)
-
-        p_path = os.path.join(OUT_DIR, f"{key}_{start}_{end}.png")
-        make_chart(df, f"AWS {key} cost {start}→{end}", p_path)
-
-        print(f"📊  {p_path}")
-
-        time.sleep(THROTTLE)
+    # Fire every grouping at once; the rate limiter keeps us under the API limit
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [executor.submit(fetch, client, start, end, g) for g in DIMENSIONS]
+
+    # totals.parquet is read in preference to the raw JSON, so it only takes
+    # its final name once every grouping has been fetched and written
+    totals_path = os.path.join(OUT_DIR, "totals.parquet")
+    tmp_path = totals_path + ".tmp"
+    try:
+        with pq.ParquetWriter(tmp_path, TOTALS_SCHEMA) as totals:
+            for g, future in zip(DIMENSIONS, futures):
+                key = g["Key"]
+                print(f"→ AWS grouping by {key} …")
+                resp = future.result()
+
+                # Save JSON data
+                json_path = os.path.join(OUT_DIR, f"raw_{key}_{start}_{end}.json")
+                with open(json_path, "wb") as f:
+                    f.write(orjson.dumps(resp, option=orjson.OPT_INDENT_2))
+                print(f"💾  Saved JSON: {json_path}")
+                write_ndjson(os.path.splitext(json_path)[0] + ".ndjson", resp)
+                totals.write_table(totals_table(key, resp))
+
+                df = resp_to_df(resp)
+
+                # limit UsageType chart to top 20 cost buckets
+                if g["Key"] == "USAGE_TYPE":
+                    df = df.head(20)
+
+                p_path = os.path.join(OUT_DIR, f"{key}_{start}_{end}.png")
+                make_chart(df, f"AWS {key} cost {start}→{end}", p_path)
+
+                print(f"📊  {p_path}")
+    except BaseException:
+        # the writer may not have created the file yet
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, totals_path)
+    print(f"💾  Saved totals: {totals_path}")
 
 if __name__ == "__main__":
     main()
@@ -1,12 +1,19 @@
 import os
-import json
 import time
 import datetime
 import argparse
+import functools
+import orjson
 import requests
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # headless: charts are only ever written to files
 import matplotlib.pyplot as plt
+from matplotlib import font_manager
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from azure.identity import AzureCliCredential
 
 # ────────── CONFIG ──────────
@@ -15,10 +22,44 @@ API_VERSION      = "2025-03-01"
 OUTPUT_DIR       = os.path.join(os.getcwd(), f"azure-cost-reports-{datetime.datetime.now().strftime('%d-%m-%Y')}")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# ARM token cached between runs, so the Azure CLI isn't spawned every time
+TOKEN_CACHE      = os.path.expanduser("~/.cache/cost-dashboard/azure_token.json")
+TOKEN_SLACK      = 300   # refresh the token this many seconds before expiry
+
+# Charts are sized for the report page (8.5" wide letter) and rastered at a fixed DPI
+CHART_SIZE       = (8, 5.3)  # inches
+CHART_DPI        = 100
+
 # throttling rules
-SHORT_SLEEP      = 10    # seconds between calls
-LONG_SLEEP       = 60    # seconds after every 4 calls
-CALLS_BEFORE_LONG = 4    # how many calls to do before the long sleep
+MAX_IN_FLIGHT    = 3     # concurrent CostManagement queries
+MAX_RETRIES      = 4     # retries per query on 429 / 5xx
+BACKOFF_FACTOR   = 1     # exponential back-off base (s) when there is no Retry-After
+
+class _CostRetry(Retry):
+    """
+    urllib3 Retry that, when there is no standard Retry-After, waits for the
+    longest of CostManagement's x-ms-ratelimit-*-retry-after headers instead
+    of falling back to the short exponential back-off.
+    """
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is not None:
+            return retry_after
+        waits = [int(v) for k, v in response.headers.items()
+                 if k.lower().startswith("x-ms-ratelimit") and k.lower().endswith("retry-after")
+                 and str(v).isdigit()]
+        return max(waits) if waits else None
+
+# One keep-alive session for every query; urllib3 retries 429s and 5xx,
+# sleeping for the server's Retry-After (or x-ms-ratelimit one) when it sends one
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=MAX_IN_FLIGHT, pool_maxsize=MAX_IN_FLIGHT,
+    max_retries=_CostRetry(total=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR,
+                           status_forcelist=[429, 500, 502, 503, 504],
+                           allowed_methods=frozenset({"POST"}),
+                           raise_on_status=False)))
+_SESSION.headers.update({"Content-Type": "application/json"})
 
 def get_last_week_range():
     today = datetime.date.today()
@@ -26,15 +67,40 @@ def get_last_week_range():
     start_date = today - datetime.timedelta(days=7)
     return start_date, end_date
 
+def _save_token(access):
+    """
+    Write the token to TOKEN_CACHE (owner read/write only).
+    """
+    try:
+        os.makedirs(os.path.dirname(TOKEN_CACHE), mode=0o700, exist_ok=True)
+        fd = os.open(TOKEN_CACHE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(orjson.dumps({"token": access.token, "expires_on": access.expires_on}))
+        os.chmod(TOKEN_CACHE, 0o600)  # in case the file already existed with wider permissions
+    except OSError as e:
+        print(f"⚠️  Could not write token cache {TOKEN_CACHE}: {e}")
+
 def get_token():
-    cred  = AzureCliCredential()
-    token = cred.get_token("https://management.azure.com/.default").token
-    return token
+    """
+    Bearer token for ARM, served from TOKEN_CACHE until it is close to expiry.
+    """
+    try:
+        with open(TOKEN_CACHE, "rb") as f:
+            cached = orjson.loads(f.read())
+        if time.time() < cached["expires_on"] - TOKEN_SLACK:
+            return cached["token"]
+    except (OSError, KeyError, TypeError, orjson.JSONDecodeError):
+        pass
+
+    cred   = AzureCliCredential()
+    access = cred.get_token("https://management.azure.com/.default")
+    _save_token(access)
+    return access.token
 
-def query_cost(token, start, end, grouping):
+def query_cost(start, end, grouping):
     """
-    Make one CostManagement/query call.
-    Retry once on 429 after SHORT_SLEEP.
+    Make one CostManagement/query call on the shared session
+    (retries are handled by its adapter).
     """
     body = {
         "type": "Usage",
@@ -54,24 +120,15 @@ def query_cost(token, start, end, grouping):
         f"/providers/Microsoft.CostManagement/query"
         f"?api-version={API_VERSION}"
     )
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type":  "application/json"
-    }
 
-    for attempt in (1, 2):
-        resp = requests.post(url, headers=headers, json=body)
-        if resp.status_code == 429 and attempt == 1:
-            print(f"⚠️  429 on {grouping['name']}, backing off for {SHORT_SLEEP}s…")
-            time.sleep(SHORT_SLEEP)
-            continue
-        try:
-            resp.raise_for_status()
-        except HTTPError:
-            print(f"\n❌  ERROR for grouping '{grouping['name']}' →", resp.status_code)
-            print(resp.text, "\n")
-            raise
-        return resp.json()
+    resp = _SESSION.post(url, data=orjson.dumps(body))
+    try:
+        resp.raise_for_status()
+    except HTTPError:
+        print(f"\n❌  ERROR for grouping '{grouping['name']}' →", resp.status_code)
+        print(resp.text, "\n")
+        raise
+    return orjson.loads(resp.content)
 
 def json_to_df(j):
     props = j["properties"]
@@ -79,6 +136,12 @@ def json_to_df(j):
     rows  = props["rows"]
     return pd.DataFrame(rows, columns=cols)
 
+# Warm the font cache once so the first chart draw doesn't pay for the lookup
+font_manager.findfont(font_manager.FontProperties(family=plt.rcParams["font.family"]))
+
+# One figure reused for every chart (cleared between uses) instead of a new one per grouping
+_CHART_FIG = plt.figure(figsize=CHART_SIZE)
+
 def plot_and_save(df, group_key, start, end):
     # Identify the cost column (ends with 'cost', case-insensitive)
     cost_col = [c for c in df.columns if c.lower().endswith("cost")][0]
@@ -113,42 +176,44 @@ def plot_and_save(df, group_key, start, end):
             raise ValueError(f"Could not find the grouping column for group_key '{group_key}' in DataFrame columns: {list(df.columns)}. Check the raw JSON file.")
 
     # Use actual_group_col for sorting and plotting labels
-    df_sorted = df.sort_values(by=cost_col, ascending=False).head(20)
+    df_sorted = df.nlargest(20, cost_col)
 
     # Handle null values in the group column (often shown as "Untagged" in Azure portal)
     if actual_group_col in df_sorted.columns:
         df_sorted[actual_group_col] = df_sorted[actual_group_col].fillna("Untagged")
     
-    # Create a larger figure size by default
-    plt.figure(figsize=(12, 8))
+    # Start from a blank page on the shared figure
+    _CHART_FIG.clf()
+    ax = _CHART_FIG.add_subplot(111)
     
     # Create numeric x positions for the bars
     x_pos = range(len(df_sorted))
     
     # Plot the bar chart using numeric positions
-    plt.bar(x_pos, df_sorted[cost_col])
+    ax.bar(x_pos, df_sorted[cost_col])
     
     # Set the x-tick positions and use labels from the identified actual_group_col
-    plt.xticks(x_pos, df_sorted[actual_group_col], rotation=45, ha="right") 
+    ax.set_xticks(x_pos, df_sorted[actual_group_col], rotation=45, ha="right") 
     
     # Add title (using the original group_key) and labels
-    plt.title(f"Azure {group_key} cost, {start}→{end}", fontsize=20) # Title still uses the intended group_key name
-    plt.ylabel(cost_col)
+    ax.set_title(f"Azure {group_key} cost, {start}→{end}", fontsize=20) # Title still uses the intended group_key name
+    ax.set_ylabel(cost_col)
     
     # Add some padding at the bottom for the rotated labels
-    plt.tight_layout(pad=3.0)
-    plt.subplots_adjust(bottom=0.25)  # Add more bottom margin for labels
+    _CHART_FIG.tight_layout(pad=3.0)
+    _CHART_FIG.subplots_adjust(bottom=0.25)  # Add more bottom margin for labels
 
     # Save the figure (using the original group_key for the filename)
     fn = f"{group_key}_{start}_{end}.png".replace(" ", "_") # Filename uses intended group_key
     outpath = os.path.join(OUTPUT_DIR, fn)
-    plt.savefig(outpath, bbox_inches='tight')  # Add tight bounding box
-    plt.close()
+    _CHART_FIG.savefig(outpath, dpi=CHART_DPI, bbox_inches='tight')  # Add tight bounding box
+    # Vector copy that generate_pdf_report.py merges into the report as-is
+    _CHART_FIG.savefig(os.path.splitext(outpath)[0] + ".pdf", bbox_inches='tight')
     print(f"📊  Saved chart: {outpath}")
 
 def main(tag_keys):
     start, end = get_last_week_range()
-    token      = get_token()
+    _SESSION.headers["Authorization"] = f"Bearer {get_token()}"
     s_iso, e_iso = start.isoformat(), end.isoformat()
 
     # Dimensions to query
@@ -166,28 +231,24 @@ def main(tag_keys):
         if tag.lower() != 'project':
              dims.append({"type":"TagKey", "name": tag})
 
-    for idx, g in enumerate(dims, start=1):
-        key = g["name"]
-        print(f"\n→ Querying grouping by {key} …")
-        j = query_cost(token, s_iso, e_iso, g)
-
-        # save raw JSON
-        json_fn = os.path.join(OUTPUT_DIR, f"raw_{key}_{s_iso}_{e_iso}.json")
-        with open(json_fn, "w") as f:
-            json.dump(j, f, indent=2)
-        print(f"💾  Wrote JSON: {json_fn}")
-
-        # build DataFrame & chart
-        df = json_to_df(j).rename(columns={"totalCost":"PreTaxCost"})
-        plot_and_save(df, key, s_iso, e_iso)
-
-        # throttle: after every CALLS_BEFORE_LONG calls, sleep LONG_SLEEP; otherwise SHORT_SLEEP
-        if idx % CALLS_BEFORE_LONG == 0 and idx < len(dims):
-            print(f"⏱  Done {CALLS_BEFORE_LONG} calls—sleeping {LONG_SLEEP}s…")
-            time.sleep(LONG_SLEEP)
-        elif idx < len(dims):
-            print(f"⏱  Sleeping {SHORT_SLEEP}s before next query…")
-            time.sleep(SHORT_SLEEP)
+    print(f"\n→ Querying {len(dims)} groupings, {MAX_IN_FLIGHT} at a time …")
+    query = functools.partial(query_cost, s_iso, e_iso)
+
+    # Queries run on the pool; files and charts are written here, in order
+    with ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT) as pool:
+        for g, j in zip(dims, pool.map(query, dims)):
+            key = g["name"]
+            print(f"\n→ Grouping by {key} …")
+
+            # save raw JSON
+            json_fn = os.path.join(OUTPUT_DIR, f"raw_{key}_{s_iso}_{e_iso}.json")
+            with open(json_fn, "wb") as f:
+                f.write(orjson.dumps(j, option=orjson.OPT_INDENT_2))
+            print(f"💾  Wrote JSON: {json_fn}")
+
+            # build DataFrame & chart
+            df = json_to_df(j).rename(columns={"totalCost":"PreTaxCost"})
+            plot_and_save(df, key, s_iso, e_iso)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
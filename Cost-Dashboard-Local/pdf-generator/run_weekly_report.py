@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+run_weekly_report.py  –  fetch last week's AWS and Azure costs side by side,
+                         then build the PDF report from both folders.
+"""
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import generate_pdf_report
+
+# The fetch modules start threads (the AWS rate limiter's refill), open a
+# session and build their chart figure at import. Threads don't survive a
+# fork, so they are imported inside the worker that uses them, never here.
+def fetch_aws():
+    import get_aws_costs
+    get_aws_costs.main()
+
+def fetch_azure(tag_keys):
+    import get_azure_costs
+    get_azure_costs.main(tag_keys)
+
+def main(tag_keys):
+    # One process per cloud: the two fetches never wait on each other, and
+    # each keeps its own matplotlib state and rate limiting
+    with ProcessPoolExecutor(max_workers=2) as ex:
+        aws   = ex.submit(fetch_aws)
+        azure = ex.submit(fetch_azure, tag_keys)
+        for cloud, future in (("AWS", aws), ("Azure", azure)):
+            future.result()
+            print(f"✅ {cloud} costs fetched")
+
+    generate_pdf_report.build_report()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Weekly AWS + Azure cost fetch and PDF report"
+    )
+    parser.add_argument(
+        "--tags", "-t", nargs="*",
+        default=[],
+        help="Extra Azure tag keys to group by (e.g. Environment CostCenter)"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main(args.tags)
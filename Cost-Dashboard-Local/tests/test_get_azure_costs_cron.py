@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import orjson
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+# the cron script creates azure-cost-reports/ in the cwd at import
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    import get_azure_costs_cron as cron
+finally:
+    os.chdir(_cwd)
+
+NEXT_LINK = "https://management.azure.com/next?$skiptoken=abc"
+
+COLUMNS = [
+    {"name": "PreTaxCost",        "type": "Number"},
+    {"name": "ResourceGroupName", "type": "String"},
+    {"name": "MeterCategory",     "type": "String"},
+    {"name": "Currency",          "type": "String"},
+]
+
+PAGES = {
+    cron._QUERY_URL: {"properties": {"nextLink": NEXT_LINK, "columns": COLUMNS, "rows": [
+        [1.5, "rg-a", "Storage", "USD"],
+        [2.0, "rg-a", "Compute", "USD"],
+        [4.0, "rg-b", "Compute", "USD"],
+    ]}},
+    NEXT_LINK: {"properties": {"nextLink": None, "columns": COLUMNS, "rows": [
+        [0.5, "rg-a", "Network", "USD"],
+        [3.0, "rg-c", "Storage", "USD"],
+    ]}},
+}
+
+
+class _Resp:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, data):
+        self.content = orjson.dumps(data)
+
+    def raise_for_status(self):
+        pass
+
+
+class QueryPairPagingTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.client = cron._CostClient("token")
+        self.client.session.post = self.post
+
+    def post(self, url, data=None, timeout=None):
+        self.calls.append((url, orjson.loads(data)))
+        return _Resp(PAGES[url])
+
+    def test_follows_next_link(self):
+        pair = cron.PAIRED_GROUPINGS["ResourceGroupName+MeterCategory"]
+        j = self.client.query_pair("2025-04-16", "2025-04-23", *pair)
+
+        self.assertEqual([url for url, _ in self.calls], [cron._QUERY_URL, NEXT_LINK])
+        # every page is the same query, only the link differs
+        self.assertEqual(self.calls[0][1], self.calls[1][1])
+        self.assertEqual(len(j["properties"]["rows"]), 5)
+        self.assertIsNone(j["properties"]["nextLink"])
+
+    def test_collapse_sums_across_pages(self):
+        pair = cron.PAIRED_GROUPINGS["ResourceGroupName+MeterCategory"]
+        j = self.client.query_pair("2025-04-16", "2025-04-23", *pair)
+
+        rows = cron.collapse(j, ["ResourceGroupName"])["properties"]["rows"]
+        self.assertEqual({r[1]: r[0] for r in rows}, {"rg-a": 4.0, "rg-b": 4.0, "rg-c": 3.0})
+
+
+if __name__ == "__main__":
+    unittest.main()